@@ -29,17 +29,16 @@ class PickupAction(Action):
         actor_location_y = self.entity.y
         inventory = self.entity.inventory
 
-        for item in self.generator.dungeon_map.items:
-            if actor_location_x == item.x and actor_location_y == item.y:
-                if len(inventory.items) >= inventory.capacity:
-                    raise exceptions.Impossible("Your inventory is full.")
+        for item in self.generator.dungeon_map.get_items_at_location(actor_location_x, actor_location_y):
+            if len(inventory.items) >= inventory.capacity:
+                raise exceptions.Impossible("Your inventory is full.")
 
-                self.generator.dungeon_map.entities.remove(item)
-                item.parent = self.entity.inventory
-                inventory.items.append(item)
+            self.generator.dungeon_map.remove_entity(item)
+            item.parent = self.entity.inventory
+            inventory.items.append(item)
 
-                self.generator.message_log.add_message(f"You picked up the {item.name}!", fg = color.item_picked_up)
-                return
+            self.generator.message_log.add_message(f"You picked up the {item.name}!", fg = color.item_picked_up)
+            return
 
         raise exceptions.Impossible("There is nothing here to pick up.")
     
@@ -123,7 +122,7 @@ class Attack(Direction):
             raise exceptions.Impossible("Nothing to attack.")  
 
         damage = max(self.entity.fighter.power - target.fighter.defense, 1)
-        attack_desc = f"{self.entity.name.capitalize()} attacks {target.name}"
+        attacker_name = self.entity.name.capitalize()
         
         if self.entity is self.generator.player:
             attack_color = color.player_atk
@@ -131,10 +130,14 @@ class Attack(Direction):
             attack_color = color.enemy_atk
             
         if damage > 0:
-            self.generator.message_log.add_message(f"{attack_desc} for {damage} hit points.", attack_color)
+            self.generator.message_log.add_message(
+                "{} attacks {} for {} hit points.", attack_color, args = (attacker_name, target.name, damage)
+            )
             target.fighter.hp -= damage
         else:
-            self.generator.message_log.add_message(f"{attack_desc} but does no damage.", attack_color)
+            self.generator.message_log.add_message(
+                "{} attacks {} but does no damage.", attack_color, args = (attacker_name, target.name)
+            )
 
 class Movement(Direction):
     
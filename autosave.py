@@ -0,0 +1,65 @@
+"""Save the game in the background every few turns and whenever the player changes floor."""
+from __future__ import annotations
+from concurrent.futures import Future, ThreadPoolExecutor
+import traceback
+from typing import Optional, TYPE_CHECKING
+import save_format
+if TYPE_CHECKING:
+    from generator import Generator
+
+AUTOSAVE_INTERVAL = 50  # Turns between autosaves.
+
+# Encodes and writes autosaves, one at a time so they land in the order they were taken.
+autosave_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_autosave_executor() -> ThreadPoolExecutor:
+    global autosave_executor
+    if autosave_executor is None:
+        autosave_executor = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = "autosave")
+    return autosave_executor
+
+
+class Autosaver:
+    """
+    Snapshots the game on the main thread, which only copies what a save holds, then compresses and writes it
+    on a worker thread.
+    """
+
+    def __init__(
+        self, generator: Generator, filename: str, interval: int = AUTOSAVE_INTERVAL,
+        codec: str = save_format.DEFAULT_CODEC,
+    ):
+        self.generator = generator
+        self.filename = filename
+        self.interval = interval
+        self.codec = codec
+        self.turns_since_save = 0
+        self.floor = generator.game_world.current_floor
+        self.pending: Optional[Future[None]] = None
+
+    def on_turn(self) -> None:
+        """Called after every turn, saves once enough turns have passed or the player is on a new floor."""
+        if not self.generator.player.is_alive:
+            return  # A finished game is never saved.
+        self.turns_since_save += 1
+        floor = self.generator.game_world.current_floor
+        if self.turns_since_save >= self.interval or floor != self.floor:
+            self.floor = floor
+            self.save()
+
+    def save(self) -> None:
+        self.turns_since_save = 0
+        self.pending = get_autosave_executor().submit(self.write, save_format.Snapshot(self.generator))
+
+    def write(self, snapshot: save_format.Snapshot) -> None:
+        try:
+            save_format.write_save(snapshot.encode(self.codec), self.filename)
+        except Exception:
+            traceback.print_exc()  # Print error to stderr, the last complete save is left in place.
+
+    def wait(self) -> None:
+        """Block until the latest autosave is written, so it can't land on top of anything written after this."""
+        if self.pending is not None:
+            self.pending.result()
+            self.pending = None
@@ -0,0 +1,207 @@
+"""Benchmarks for dungeon generation over fixed seeds, written out as JSON so runs from different commits compare.
+
+Run from the repository root with `python -m benchmarks.generation --output bench_output.json`.
+"""
+from __future__ import annotations
+import argparse
+import itertools
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Sequence
+import numpy as np
+import entity_list
+import procedure_gen
+from generator import Generator
+from map import DungeonMap, GameWorld
+
+SEEDS = (1, 2, 3)
+MAP_SIZES = ((80, 43), (160, 86), (320, 172))
+MAX_ROOMS = (30, 100, 300)
+FLOORS = (1, 5, 10)
+LAYOUTS = tuple(procedure_gen.ROOM_LAYOUTS)
+MIN_ROOM_SIZE = 6
+MAX_ROOM_SIZE = 10
+TUNNELS_PER_RUN = 1000
+ROOMS_PER_RUN = 100
+
+
+def new_generator(map_width: int, map_height: int, max_rooms: int, floor: int, layout: str, seed: int) -> Generator:
+    """Return a generator whose next `generate_floor` call builds the given floor."""
+    generator = Generator(entity_list.player.instantiate())
+    generator.message_log.spill_filename = None
+    generator.game_world = GameWorld(
+        generator = generator,
+        map_width = map_width,
+        map_height = map_height,
+        max_rooms = max_rooms,
+        min_room_size = MIN_ROOM_SIZE,
+        max_room_size = MAX_ROOM_SIZE,
+        current_floor = floor - 1,
+        layout = layout,
+        seed = seed,
+        prefetch = False,  # Time the synchronous generation, without a worker competing for the CPU.
+    )
+    return generator
+
+
+def measure(setup: Callable[[], Callable[[], Any]], repeats: int) -> List[float]:
+    """Time `repeats` runs of the callable returned by `setup`, which seeds each run identically."""
+    timings = []
+    for _ in range(repeats):
+        run = setup()
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def bench_generate_dungeon(
+    map_width: int, map_height: int, max_rooms: int, floor: int, layout: str, seed: int,
+) -> Callable[[], Any]:
+    generator = new_generator(map_width, map_height, max_rooms, floor, layout, seed)
+    generator.game_world.current_floor = floor
+    return lambda: procedure_gen.generate_dungeon(
+        max_rooms = max_rooms,
+        min_room_size = MIN_ROOM_SIZE,
+        max_room_size = MAX_ROOM_SIZE,
+        map_width = map_width,
+        map_height = map_height,
+        generator = generator,
+        layout = layout,
+        floor = floor,
+        layout_rng = generator.game_world.floor_rng(floor, "layout"),
+        spawn_rng = generator.game_world.floor_rng(floor, "spawns"),
+    )
+
+
+def bench_generate_floor(
+    map_width: int, map_height: int, max_rooms: int, floor: int, layout: str, seed: int,
+) -> Callable[[], Any]:
+    generator = new_generator(map_width, map_height, max_rooms, floor, layout, seed)
+    return generator.game_world.generate_floor
+
+
+def bench_l_tunnel(
+    map_width: int, map_height: int, max_rooms: int, floor: int, layout: str, seed: int,
+) -> Callable[[], Any]:
+    rng = random.Random(seed)
+    endpoints = rng.choices(
+        [(x, y) for x in range(1, map_width - 1) for y in range(1, map_height - 1)], k = TUNNELS_PER_RUN * 2
+    )
+
+    def run() -> None:
+        for begin, end in zip(endpoints[::2], endpoints[1::2]):
+            for _ in procedure_gen.L_tunnel(begin, end, rng):
+                pass
+    return run
+
+
+def bench_spawn_entities(
+    map_width: int, map_height: int, max_rooms: int, floor: int, layout: str, seed: int,
+) -> Callable[[], Any]:
+    generator = new_generator(map_width, map_height, max_rooms, floor, layout, seed)
+    dungeon = DungeonMap(generator, map_width, map_height)
+    rooms = [
+        procedure_gen.RectRoom(
+            (i * MAX_ROOM_SIZE) % (map_width - MAX_ROOM_SIZE - 1),
+            (i * 3) % (map_height - MAX_ROOM_SIZE - 1),
+            MAX_ROOM_SIZE,
+            MAX_ROOM_SIZE,
+        )
+        for i in range(ROOMS_PER_RUN)
+    ]
+
+    rng = np.random.default_rng(seed)
+    return lambda: procedure_gen.spawn_entities(rooms, dungeon, floor, rng)
+
+
+BENCHMARKS: Dict[str, Callable[[int, int, int, int, str, int], Callable[[], Any]]] = {
+    "generate_dungeon": bench_generate_dungeon,
+    "generate_floor": bench_generate_floor,
+    "L_tunnel": bench_l_tunnel,
+    "spawn_entities": bench_spawn_entities,
+}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output = True, text = True, check = True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_suite(
+    names: Sequence[str], seeds: Sequence[int], map_sizes: Sequence[Sequence[int]],
+    max_rooms: Sequence[int], floors: Sequence[int], layouts: Sequence[str], repeats: int,
+) -> Dict[str, Any]:
+    results = []
+    for name in names:
+        for (map_width, map_height), rooms, floor, layout, seed in itertools.product(
+            map_sizes, max_rooms, floors, layouts, seeds
+        ):
+            timings = measure(
+                lambda: BENCHMARKS[name](map_width, map_height, rooms, floor, layout, seed), repeats
+            )
+            results.append({
+                "benchmark": name,
+                "map_width": map_width,
+                "map_height": map_height,
+                "max_rooms": rooms,
+                "floor": floor,
+                "layout": layout,
+                "seed": seed,
+                "repeats": repeats,
+                "min_s": min(timings),
+                "median_s": statistics.median(timings),
+                "mean_s": statistics.mean(timings),
+            })
+            print(
+                f"{name} {map_width}x{map_height} rooms={rooms} floor={floor} layout={layout} seed={seed}: "
+                f"{min(timings) * 1000:.2f}ms",
+                file = sys.stderr,
+            )
+    return {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument("--benchmark", action = "append", choices = sorted(BENCHMARKS), help = "Run only these.")
+    parser.add_argument("--seed", type = int, action = "append", help = "Seeds to run, defaults to 1 2 3.")
+    parser.add_argument("--max-rooms", type = int, action = "append", help = "Room counts to sweep.")
+    parser.add_argument("--floor", type = int, action = "append", help = "Floor depths to sweep.")
+    parser.add_argument("--layout", action = "append", choices = LAYOUTS, help = "Room layouts to sweep.")
+    parser.add_argument("--repeats", type = int, default = 5)
+    parser.add_argument("--quick", action = "store_true", help = "Only sweep the default 80x43 map size.")
+    parser.add_argument("--output", help = "Write the JSON results here instead of stdout.")
+    args = parser.parse_args()
+
+    report = run_suite(
+        names = args.benchmark or sorted(BENCHMARKS),
+        seeds = args.seed or SEEDS,
+        map_sizes = MAP_SIZES[:1] if args.quick else MAP_SIZES,
+        max_rooms = args.max_rooms or MAX_ROOMS,
+        floors = args.floor or FLOORS,
+        layouts = args.layout or LAYOUTS,
+        repeats = args.repeats,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent = 2)
+    else:
+        json.dump(report, sys.stdout, indent = 2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Benchmarks for saving and loading games with each codec, against the old pickle+lzma saves, written out as JSON.
+
+Run from the repository root with `python -m benchmarks.save --output bench_output.json`.
+"""
+from __future__ import annotations
+import argparse
+import json
+import lzma
+import pickle
+import platform
+import statistics
+import sys
+from typing import Any, Callable, Dict, Sequence, Tuple
+import save_format
+from benchmarks.generation import git_revision, measure
+from generator import Generator
+from headless import new_headless_game
+
+SEEDS = (1, 2, 3)
+FLOORS_VISITED = (1, 5, 20)
+MESSAGES = 1000
+
+
+def new_game(seed: int, floors_visited: int) -> Generator:
+    """Return a game which has been through `floors_visited` floors and has a full message log."""
+    generator = new_headless_game(seed)
+    generator.game_world.prefetch = False
+    for _ in range(floors_visited - 1):
+        generator.game_world.generate_floor()
+    for i in range(MESSAGES):
+        generator.message_log.add_message("Message {}.", args = (i,))
+    generator.update()
+    return generator
+
+
+def legacy_dumps(generator: Generator) -> bytes:
+    return lzma.compress(pickle.dumps(generator))
+
+
+def legacy_loads(data: bytes) -> Generator:
+    generator = pickle.loads(lzma.decompress(data))
+    assert isinstance(generator, Generator)
+    return generator
+
+
+# Format name to its save and load functions.
+FORMATS: Dict[str, Tuple[Callable[[Generator], bytes], Callable[[bytes], Generator]]] = {
+    **{
+        codec: ((lambda generator, codec = codec: save_format.dumps(generator, codec)), save_format.loads)
+        for codec in save_format.CODECS
+    },
+    "pickle+lzma": (legacy_dumps, legacy_loads),
+}
+
+
+def run_suite(names: Sequence[str], seeds: Sequence[int], floors: Sequence[int], repeats: int) -> Dict[str, Any]:
+    results = []
+    for seed in seeds:
+        for floors_visited in floors:
+            generator = new_game(seed, floors_visited)
+            for name in names:
+                dumps, loads = FORMATS[name]
+                data = dumps(generator)
+                timings = {
+                    "save": measure(lambda: lambda: dumps(generator), repeats),
+                    "load": measure(lambda: lambda: loads(data), repeats),
+                }
+                for operation, operation_timings in timings.items():
+                    results.append({
+                        "benchmark": operation,
+                        "format": name,
+                        "seed": seed,
+                        "floors_visited": floors_visited,
+                        "size_bytes": len(data),
+                        "repeats": repeats,
+                        "min_s": min(operation_timings),
+                        "median_s": statistics.median(operation_timings),
+                        "mean_s": statistics.mean(operation_timings),
+                    })
+                    print(
+                        f"{operation} {name} seed={seed} floors={floors_visited}: "
+                        f"{min(operation_timings) * 1000:.2f}ms, {len(data)} bytes",
+                        file = sys.stderr,
+                    )
+    return {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument("--format", action = "append", choices = sorted(FORMATS), help = "Run only these.")
+    parser.add_argument("--seed", type = int, action = "append", help = "Seeds to run, defaults to 1 2 3.")
+    parser.add_argument("--floors", type = int, action = "append", help = "Numbers of visited floors to sweep.")
+    parser.add_argument("--repeats", type = int, default = 5)
+    parser.add_argument("--output", help = "Write the JSON results here instead of stdout.")
+    args = parser.parse_args()
+
+    report = run_suite(
+        names = args.format or list(FORMATS),
+        seeds = args.seed or SEEDS,
+        floors = args.floors or FLOORS_VISITED,
+        repeats = args.repeats,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent = 2)
+    else:
+        json.dump(report, sys.stdout, indent = 2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,35 @@
 from __future__ import annotations
-import random
-from typing import List, Optional, Tuple, TYPE_CHECKING
-import numpy as np  
+from collections import deque
+from typing import Deque, List, Optional, Tuple, TYPE_CHECKING
 import tcod
 from action import Action, Attack, Movement, Wait, ActionOfChoice
 if TYPE_CHECKING:
     from entities import Actor
 
+# A cached path is recomputed once its destination drifts this many tiles from where it was aimed.
+PATH_RETARGET_DISTANCE = 2
+
 class BaseAI(Action):
     def act(self) -> None:
         raise NotImplementedError()
 
+    @property
+    def is_idle(self) -> bool:
+        """True if this AI does nothing unless it sees the player, so it can sleep until it does."""
+        return False
+
+    def take_turn(self, visible: bool, distance: int) -> None:
+        """Act with whether this actor stands in the players sight and its Chebyshev distance to the player
+        already worked out, as Generator.handle_monster_turns does for every monster at once.
+        """
+        self.act()
+
     def get_path_to(self, dest_x: int, dest_y: int) -> List[Tuple[int, int]]:
         """Compute and return a path to the target position.
 
         If there is no valid path then returns an empty list.
         """
-        # Copy the walkable array.
-        cost = np.array(self.entity.dungeon_map.tiles["walkable"], dtype = np.int8)
-
-        for entity in self.entity.dungeon_map.entities:
-            # Check that an entity blocks movement and the cost isn't zero (blocking.)
-            if entity.blocks_movement and cost[entity.x, entity.y]:
-                # Add to the cost of a blocked position.
-                # A lower number means more enemies will crowd behind each other in
-                # hallways.  A higher number means enemies will take longer paths in
-                # order to surround the player.
-                cost[entity.x, entity.y] += 10
+        cost = self.entity.dungeon_map.get_cost_map()
 
         # Create a graph from the cost array and pass that graph to a new pathfinder.
         graph = tcod.path.SimpleGraph(cost = cost, cardinal = 2, diagonal = 3)
@@ -61,7 +64,7 @@ class ConfusedEnemy(BaseAI):
             self.entity.ai = self.previous_ai
         else:
             # Pick a random direction
-            direction_x, direction_y = random.choice(
+            direction_x, direction_y = self.generator.game_world.ai_rng.choice(
                 [
                     (-1, -1),  # Northwest
                     (0, -1),  # North
@@ -83,22 +86,66 @@ class ConfusedEnemy(BaseAI):
 class HostileEnemy(BaseAI):
     def __init__(self, entity: Actor):
         super().__init__(entity)
-        self.path: List[Tuple[int, int]] = []
+        self.path: Deque[Tuple[int, int]] = deque()
+        self.path_target: Optional[Tuple[int, int]] = None
+        self.path_version = 0  # The maps blocking_version when the path was computed.
+        self.last_seen_target: Optional[Tuple[int, int]] = None
+
+    @property
+    def is_idle(self) -> bool:
+        return not self.last_seen_target and not self.path
+
+    def update_path(self, dest_x: int, dest_y: int) -> None:
+        """Make `path` lead to the destination, reusing the cached path unless the destination moved far enough
+        from it or a blocking entity has since arrived on or left one of its tiles.
+        """
+        dungeon_map = self.entity.dungeon_map
+        if self.path and self.path_target:
+            target_x, target_y = self.path_target
+            if (
+                max(abs(dest_x - target_x), abs(dest_y - target_y)) < PATH_RETARGET_DISTANCE
+                and not dungeon_map.blocking_changed_since(self.path_version, self.path)
+            ):
+                return
+
+        self.path = deque(self.get_path_to(dest_x, dest_y))
+        self.path_target = dest_x, dest_y
+        self.path_version = dungeon_map.blocking_version
 
     def act(self) -> None:
         target = self.generator.player
-        dx = target.x - self.entity.x
-        dy = target.y - self.entity.y
-        distance = max(abs(dx), abs(dy))  # Chebyshev distance.
+        distance = max(abs(target.x - self.entity.x), abs(target.y - self.entity.y))  # Chebyshev distance.
+        self.take_turn(bool(self.generator.dungeon_map.visible[self.entity.x, self.entity.y]), distance)
 
-        if self.generator.dungeon_map.visible[self.entity.x, self.entity.y]:
+    def take_turn(self, visible: bool, distance: int) -> None:
+        target = self.generator.player
+        if visible:
             if distance <= 1:
-                return Attack(self.entity, dx, dy).act()
+                return Attack(self.entity, target.x - self.entity.x, target.y - self.entity.y).act()
+
+            # Follow the distance map shared by every monster chasing the player this turn.
+            self.path.clear()
+            self.last_seen_target = target.x, target.y
+            step = self.generator.dungeon_map.get_downhill_step(
+                self.generator.player_distance_map, self.entity.x, self.entity.y
+            )
+            if step:
+                return Movement(self.entity, step[0] - self.entity.x, step[1] - self.entity.y,).act()
+            return Wait(self.entity).act()
+
+        if not self.last_seen_target and not self.path:
+            return None  # Idle, waiting doesn't do anything.
 
-            self.path = self.get_path_to(target.x, target.y)
+        if self.last_seen_target:
+            # The player was lost from sight, head to where they were last seen.
+            self.update_path(*self.last_seen_target)
+            if not self.path:  # Arrived, or there is no way there.
+                self.last_seen_target = None
 
         if self.path:
-            dest_x, dest_y = self.path.pop(0)
-            return Movement(self.entity, dest_x - self.entity.x, dest_y - self.entity.y,).act()
+            dest_x, dest_y = self.path[0]
+            Movement(self.entity, dest_x - self.entity.x, dest_y - self.entity.y,).act()
+            self.path.popleft()  # Only consume the step once it was taken, a blocked step is retried.
+            return None
 
         return Wait(self.entity).act()
\ No newline at end of file
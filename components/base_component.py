@@ -1,10 +1,11 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING
+from typing import TypeVar, TYPE_CHECKING
 if TYPE_CHECKING:
     from generator import Generator
     from entities import Entity
     from map import DungeonMap
 
+C = TypeVar("C", bound = "BaseComponent")
 
 class BaseComponent:
     parent: Entity  # Owning entity instance.
@@ -15,4 +16,14 @@ class BaseComponent:
     
     @property
     def generate(self) -> Generator:
-        return self.dungeon_map.generator
\ No newline at end of file
+        return self.dungeon_map.generator
+
+    def clone(self: C, parent: Entity) -> C:
+        """Return a copy of this component for a newly spawned entity.
+
+        Components which hold mutable containers or references to other entities override this.
+        """
+        component = object.__new__(type(self))
+        component.__dict__.update(self.__dict__)
+        component.parent = parent
+        return component
\ No newline at end of file
@@ -93,8 +93,8 @@ class LightningDamageConsumable(Consumable):
         target = None
         closest_distance = self.maximum_range + 1.0
 
-        for actor in self.generate.dungeon_map.actors:
-            if actor is not consumer and self.parent.dungeon_map.visible[actor.x, actor.y]:
+        for actor in self.generate.dungeon_map.get_visible_actors():
+            if actor is not consumer:
                 distance = consumer.distance(actor.x, actor.y)
 
                 if distance < closest_distance:
@@ -132,13 +132,12 @@ class FireballDamageConsumable(Consumable):
             raise Impossible("You cannot target an area that you cannot see.")
 
         targets_hit = False
-        for actor in self.generate.dungeon_map.actors:
-            if actor.distance(*target_xy) <= self.radius:
-                self.generate.message_log.add_message(
-                    f"The {actor.name} is engulfed in a fiery explosion, taking {self.damage} damage!", fg = entity_list.fireball_scroll.color
-                )
-                actor.fighter.take_damage(self.damage)
-                targets_hit = True
+        for actor in self.generate.dungeon_map.get_actors_within_radius(*target_xy, self.radius):
+            self.generate.message_log.add_message(
+                f"The {actor.name} is engulfed in a fiery explosion, taking {self.damage} damage!", fg = entity_list.fireball_scroll.color
+            )
+            actor.fighter.take_damage(self.damage)
+            targets_hit = True
 
         if not targets_hit:
             raise Impossible("There are no targets in the radius.")
@@ -59,6 +59,23 @@ class Equipment(BaseComponent):
 
         return bonus
 
+    def clone(self, parent: Actor) -> Equipment:  # type: ignore[override]
+        """Copy the equipment of a prototype, equipped items become the matching items of the new inventory,
+        so the inventory must be cloned first.
+        """
+        equipment = super().clone(parent)
+        old_items = self.parent.inventory.items
+        for slot in ("weapon", "armor", "ring"):
+            item = getattr(self, slot)
+            if item is None:
+                continue
+            if item in old_items:
+                item = parent.inventory.items[old_items.index(item)]
+            else:
+                item = item.instantiate()
+            setattr(equipment, slot, item)
+        return equipment
+
     def item_is_equipped(self, item: Item) -> bool:
         return self.weapon == item or self.armor == item or self.ring == item
 
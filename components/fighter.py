@@ -22,6 +22,8 @@ class Fighter(BaseComponent):
     @hp.setter
     def hp(self, value: int) -> None:
         self._hp = max(0, min(value, self.max_hp))
+        if self.parent.is_on_map:
+            self.dungeon_map.update_entity_state(self.parent)
         if self._hp == 0 and self.parent.ai:
             self.die()
         
@@ -72,6 +74,12 @@ class Fighter(BaseComponent):
         self.parent.ai = None
         self.parent.name = f"remains of {self.parent.name}"
         self.parent.render_order = RenderOrder.CORPSE 
+        if self.generate.player is self.parent:
+            self.dungeon_map.mark_appearance_changed()
+            self.dungeon_map.update_entity_state(self.parent)
+        else:
+            # Monster remains are only a glyph, so they don't weigh on entity scans, rendering and saves.
+            self.dungeon_map.add_corpse(self.parent)
         self.generate.message_log.add_message(death_message, death_message_color)    
         self.generate.player.level.add_xp(self.parent.level.xp_given)
         
@@ -12,6 +12,15 @@ class Inventory(BaseComponent):
         self.capacity = capacity
         self.items: List[Item] = []
 
+    def clone(self, parent: Actor) -> Inventory:  # type: ignore[override]
+        inventory = super().clone(parent)
+        inventory.items = []
+        for item in self.items:
+            new_item = item.instantiate()
+            new_item.parent = inventory
+            inventory.items.append(new_item)
+        return inventory
+
     def drop(self, item: Item) -> None:
         """
         Removes an item from the inventory and restores it to the game map, at the player's current location.
@@ -1,8 +1,9 @@
 from __future__ import annotations
-import copy
+import functools
 import math
 from typing import Optional, Tuple, Type, TypeVar, TYPE_CHECKING, Union
 from render_order import RenderOrder
+from scheduler import NORMAL_SPEED
 if TYPE_CHECKING:
     from components.consumable import Consumable
     from components.ai import BaseAI
@@ -14,8 +15,18 @@ if TYPE_CHECKING:
     from components.level import Level
 
 T = TypeVar("T", bound = "Entity")
+
+
+@functools.lru_cache(maxsize = None)
+def prototype_fields(cls: Type[Entity]) -> Tuple[str, ...]:
+    """The slots an entity copies from its prototype, which is all of them except its parent."""
+    return tuple(name for klass in cls.__mro__ for name in getattr(klass, "__slots__", ()) if name != "parent")
+
 # Class for all entities including player, items, enemies, and others
 class Entity:
+    # Entities are numerous, slots keep them small. Their position, hit points and flags are also
+    # kept in the entity store of the map they are on.
+    __slots__ = ("parent", "x", "y", "char", "color", "name", "_blocks_movement", "render_order")
     parent: Union[DungeonMap, Inventory]
     def __init__(self, parent: Optional[DungeonMap] = None, x: int = 0, y: int = 0, 
                  char: str = "?", color: Tuple[int, int, int] = (255, 255, 255), 
@@ -26,34 +37,67 @@ class Entity:
         self.char = char
         self.color = color
         self.name = name
-        self.blocks_movement = blocks_movement
+        self._blocks_movement = blocks_movement
         self.render_order = render_order
         if parent:
             # If parent isn't provided now then it will be set later.
             self.parent = parent
-            parent.entities.add(self)
+            parent.add_entity(self)
             
     @property
     def dungeon_map(self) -> DungeonMap:
         return self.parent.dungeon_map
+
+    @property
+    def is_on_map(self) -> bool:
+        """True if this entity is placed on a map, rather than in an inventory or used as a prototype.
+
+        Monster corpses keep their map as parent but are no longer stored on it, so they aren't on it either.
+        """
+        return hasattr(self, "parent") and self.parent is self.dungeon_map and self in self.parent.entity_store.rows
+
+    @property
+    def blocks_movement(self) -> bool:
+        return self._blocks_movement
+
+    @blocks_movement.setter
+    def blocks_movement(self, value: bool) -> None:
+        changed = value != self._blocks_movement
+        self._blocks_movement = value
+        if changed and self.is_on_map:
+            # Keep the maps pathfinding costs in sync when an entity starts or stops blocking, such as on death.
+            self.dungeon_map.change_blocking(self.x, self.y, 1 if value else -1)
+            self.dungeon_map.update_entity_state(self)
             
+    def instantiate(self: T) -> T:
+        """Return a new entity, without a parent, using this one as its prototype.
+
+        Immutable data such as the char, color and name is shared with the prototype,
+        only mutable state is copied.
+        """
+        clone = object.__new__(type(self))
+        for name in prototype_fields(type(self)):
+            setattr(clone, name, getattr(self, name))
+        return clone
+
     def spawn(self: T, dungeon_map: DungeonMap, x: int, y: int) -> T:
-        clone = copy.deepcopy(self)
+        clone = self.instantiate()
         clone.x = x
         clone.y = y
         clone.parent = dungeon_map
-        dungeon_map.entities.add(clone)
+        dungeon_map.add_entity(clone)
         return clone
     
     def place(self, x: int, y: int, dungeon_map: Optional[DungeonMap] = None) -> None:
         self.x = x
         self.y = y
         if dungeon_map:
-            if hasattr(self, "parent"):  # Possibly uninitialized.
-                if self.parent is self.dungeon_map:
-                    self.dungeon_map.entities.remove(self)
+            if self.is_on_map:
+                self.dungeon_map.remove_entity(self)
             self.parent = dungeon_map
-            dungeon_map.entities.add(self)
+            dungeon_map.add_entity(self)
+        elif self.is_on_map:
+            self.dungeon_map.update_entity_location(self)
     
     def distance(self, x: int, y: int) -> float:
         """
@@ -64,8 +108,12 @@ class Entity:
     def move(self, dx: int, dy: int) -> None:
         self.x += dx
         self.y += dy
+        if self.is_on_map:
+            self.dungeon_map.update_entity_location(self)
 
 class Actor(Entity):
+    __slots__ = ("ai_cls", "ai", "fighter", "inventory", "equipment", "level", "speed")
+
     def __init__(
         self,
         *,
@@ -79,6 +127,7 @@ class Actor(Entity):
         inventory: Inventory,
         equipment: Equipment,
         level: Level,
+        speed: int = NORMAL_SPEED,
     ):
         super().__init__(
             x = x,
@@ -90,6 +139,7 @@ class Actor(Entity):
             render_order = RenderOrder.ACTOR,
         )
 
+        self.ai_cls = ai_cls
         self.ai: Optional[BaseAI] = ai_cls(self)
         self.fighter = fighter
         self.fighter.parent = self
@@ -99,6 +149,16 @@ class Actor(Entity):
         self.equipment.parent = self
         self.level = level
         self.level.parent = self
+        self.speed = speed  # How often this actor acts, NORMAL_SPEED acts once per player action at normal speed.
+
+    def instantiate(self) -> Actor:
+        clone = super().instantiate()
+        clone.ai = self.ai_cls(clone) if self.ai else None
+        clone.fighter = self.fighter.clone(clone)
+        clone.inventory = self.inventory.clone(clone)
+        clone.equipment = self.equipment.clone(clone)
+        clone.level = self.level.clone(clone)
+        return clone
 
     @property
     def is_alive(self) -> bool:
@@ -106,6 +166,8 @@ class Actor(Entity):
         return bool(self.ai) 
 
 class Item(Entity):
+    __slots__ = ("consumable", "equippable")
+
     def __init__(
         self,
         *,
@@ -133,4 +195,11 @@ class Item(Entity):
 
         self.equippable = equippable
         if self.equippable:
-            self.equippable.parent = self
\ No newline at end of file
+            self.equippable.parent = self
+
+    def instantiate(self) -> Item:
+        clone = super().instantiate()
+        if self.consumable:
+            clone.consumable = self.consumable.clone(clone)
+        # Equippables only hold stats, so every item spawned from a prototype shares the prototype's equippable.
+        return clone
\ No newline at end of file
@@ -0,0 +1,95 @@
+"""Column storage for the core state of the entities on a map."""
+from __future__ import annotations
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+import numpy as np
+if TYPE_CHECKING:
+    from entities import Entity
+
+INITIAL_CAPACITY = 64
+
+
+class EntityStore:
+    """
+    Keeps the position, hit points and flags of every entity on a map in parallel arrays, one row per entity,
+    so queries over all of them are single array expressions instead of loops over Python objects.
+
+    The entities themselves stay the authority, the map copies their state in whenever it changes.
+    Rows of removed entities are reused.
+    """
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        self.entities: List[Optional[Entity]] = [None] * capacity
+        self.rows: Dict[Entity, int] = {}
+        self.free_rows: List[int] = list(range(capacity - 1, -1, -1))
+        self.in_use = np.zeros(capacity, dtype = bool)
+        self.x = np.zeros(capacity, dtype = np.int32)
+        self.y = np.zeros(capacity, dtype = np.int32)
+        self.hp = np.zeros(capacity, dtype = np.int32)
+        self.blocks_movement = np.zeros(capacity, dtype = bool)
+        self.render_order = np.zeros(capacity, dtype = np.int8)
+        self.alive = np.zeros(capacity, dtype = bool)  # Actors which can still act.
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def grow(self) -> None:
+        capacity = len(self.entities)
+        self.entities.extend([None] * capacity)
+        self.free_rows.extend(range(capacity * 2 - 1, capacity - 1, -1))
+        for name in ("in_use", "x", "y", "hp", "blocks_movement", "render_order", "alive"):
+            column = getattr(self, name)
+            setattr(self, name, np.concatenate([column, np.zeros_like(column)]))
+
+    def add(self, entity: Entity) -> None:
+        if not self.free_rows:
+            self.grow()
+        row = self.free_rows.pop()
+        self.entities[row] = entity
+        self.rows[entity] = row
+        self.in_use[row] = True
+        self.x[row] = entity.x
+        self.y[row] = entity.y
+        self.update(entity)
+
+    def remove(self, entity: Entity) -> None:
+        row = self.rows.pop(entity)
+        self.entities[row] = None
+        self.in_use[row] = False
+        self.alive[row] = False
+        self.blocks_movement[row] = False
+        self.free_rows.append(row)
+
+    def location(self, entity: Entity) -> Tuple[int, int]:
+        """Return the position an entity was last stored at."""
+        row = self.rows[entity]
+        return int(self.x[row]), int(self.y[row])
+
+    def move(self, entity: Entity) -> None:
+        row = self.rows[entity]
+        self.x[row] = entity.x
+        self.y[row] = entity.y
+
+    def update(self, entity: Entity) -> None:
+        """Copy an entities hit points, flags and render order into its row."""
+        row = self.rows[entity]
+        fighter = getattr(entity, "fighter", None)
+        self.hp[row] = fighter.hp if fighter is not None else 0
+        self.blocks_movement[row] = entity.blocks_movement
+        self.render_order[row] = entity.render_order.value
+        self.alive[row] = bool(getattr(entity, "ai", None))
+
+    def select(self, mask: np.ndarray) -> List[Entity]:
+        """Return the entities of the rows where `mask` is True, in row order."""
+        return [self.entities[row] for row in np.flatnonzero(mask).tolist()]  # type: ignore[misc]
+
+    def squared_distances(self, x: int, y: int) -> np.ndarray:
+        """Return the squared distance from (x, y) to every row, compare against squared radii to avoid square roots."""
+        return (self.x - x) ** 2 + (self.y - y) ** 2
+
+    def within_radius(self, x: int, y: int, radius: float) -> np.ndarray:
+        """Return a mask of the rows within `radius` of (x, y)."""
+        return self.in_use & (self.squared_distances(x, y) <= radius * radius)
+
+    def visible(self, visible: np.ndarray) -> np.ndarray:
+        """Return a mask of the rows standing on tiles which are True in `visible`."""
+        return self.in_use & visible[self.x, self.y]
@@ -0,0 +1,89 @@
+"""Keep the floors the player has left, so they can be revisited without holding every one of them in memory."""
+from __future__ import annotations
+from collections import OrderedDict
+import io
+import os
+import tempfile
+from typing import Any, Dict, Optional, TYPE_CHECKING
+import numpy as np
+from save_format import floor_arrays, floor_from_arrays, pack_arrays
+if TYPE_CHECKING:
+    from generator import Generator
+    from map import DungeonMap
+
+HOT_FLOORS = 3  # Floors kept in memory as they are, the least recently used ones beyond this are archived to disk.
+
+
+def archive_floor(dungeon_map: DungeonMap) -> bytes:
+    """Return a compact copy of a floor, in the same form as floors in a save file."""
+    return pack_arrays(floor_arrays(dungeon_map))
+
+
+def restore_floor(data: bytes, generator: Generator) -> DungeonMap:
+    """Rebuild a floor from `archive_floor` data."""
+    with np.load(io.BytesIO(data)) as archive:
+        return floor_from_arrays(archive, generator)
+
+
+class FloorStore:
+    """
+    Holds every floor except the current one. Recently left floors stay in memory, older ones are archived
+    to a temporary directory and read back when they are revisited.
+    """
+
+    def __init__(self, generator: Generator, hot_floors: int = HOT_FLOORS):
+        self.generator = generator
+        self.hot_floors = hot_floors
+        self.hot: OrderedDict[int, DungeonMap] = OrderedDict()  # Least recently used first.
+        self.archived: Dict[int, str] = {}  # Floor number to archive filename.
+        self.directory: Optional[tempfile.TemporaryDirectory[str]] = None
+
+    def __contains__(self, floor: int) -> bool:
+        return floor in self.hot or floor in self.archived
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Pickles hold every stored floor in its archived form, the temporary directory can't be pickled."""
+        return {"generator": self.generator, "hot_floors": self.hot_floors, "archives": self.archives()}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(state["generator"], state["hot_floors"])  # type: ignore
+        for floor, data in state["archives"].items():
+            self.write_archive(floor, data)
+
+    def archives(self) -> Dict[int, bytes]:
+        """Return the archived form of every stored floor, least recently used first."""
+        archives = {}
+        for floor, filename in self.archived.items():
+            with open(filename, "rb") as f:
+                archives[floor] = f.read()
+        for floor, dungeon_map in self.hot.items():
+            archives[floor] = archive_floor(dungeon_map)
+        return archives
+
+    def put(self, floor: int, dungeon_map: DungeonMap) -> None:
+        """Store a floor the player just left."""
+        self.hot[floor] = dungeon_map
+        self.hot.move_to_end(floor)
+        while len(self.hot) > self.hot_floors:
+            old_floor, old_map = self.hot.popitem(last = False)
+            self.write_archive(old_floor, archive_floor(old_map))
+
+    def take(self, floor: int) -> Optional[DungeonMap]:
+        """Remove and return a stored floor so it can become the current floor, or None if it isn't stored."""
+        if floor in self.hot:
+            return self.hot.pop(floor)
+        filename = self.archived.pop(floor, None)
+        if filename is None:
+            return None
+        with open(filename, "rb") as f:
+            data = f.read()
+        os.remove(filename)
+        return restore_floor(data, self.generator)
+
+    def write_archive(self, floor: int, data: bytes) -> None:
+        if self.directory is None:
+            self.directory = tempfile.TemporaryDirectory(prefix = "labyrinth-floors-")
+        filename = os.path.join(self.directory.name, f"floor_{floor}.npz")
+        with open(filename, "wb") as f:
+            f.write(data)
+        self.archived[floor] = filename
@@ -0,0 +1,50 @@
+"""Decide when the main loop actually needs to draw a new frame."""
+from __future__ import annotations
+from typing import Optional, Tuple, TYPE_CHECKING
+import tcod
+if TYPE_CHECKING:
+    from input_handler import BaseEventHandler
+
+# Events which no handler reacts to, so they can never change what is on screen.
+IDLE_EVENTS = (tcod.event.KeyUp, tcod.event.MouseButtonUp)
+
+
+class FrameScheduler:
+    """
+    Tracks whether the game, the active handler or the hovered tile changed since the last frame was presented.
+    Every event returned by one `tcod.event.wait()` call is handled before asking for a frame, so bursts of events
+    are coalesced into a single render.
+    """
+
+    def __init__(self) -> None:
+        self.needs_render = True  # The first frame is always drawn.
+        self.frames_rendered = 0
+        self.frames_skipped = 0
+        self.mouse_tile: Optional[Tuple[int, int]] = None
+
+    def mark_dirty(self) -> None:
+        """Force the next frame to be rendered."""
+        self.needs_render = True
+
+    def on_event(self, event: tcod.event.Event, old_handler: BaseEventHandler, new_handler: BaseEventHandler) -> None:
+        """Record whether handling `event` could have changed what is drawn."""
+        if isinstance(event, tcod.event.MouseMotion):
+            mouse_tile = int(event.tile.x), int(event.tile.y)
+            if mouse_tile != self.mouse_tile:  # Hovering a new tile changes the names shown under the mouse.
+                self.mouse_tile = mouse_tile
+                self.needs_render = True
+        elif not isinstance(event, IDLE_EVENTS):
+            self.needs_render = True
+
+        if new_handler is not old_handler:
+            self.needs_render = True
+
+    def begin_frame(self) -> bool:
+        """Return True if a frame should be rendered and presented now, counting the frame either way."""
+        if not self.needs_render:
+            self.frames_skipped += 1
+            return False
+
+        self.needs_render = False
+        self.frames_rendered += 1
+        return True
@@ -1,16 +1,19 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING
+from typing import Optional, TYPE_CHECKING
 from tcod.console import Console
 from tcod.map import compute_fov
 import render_functions
 from message_log import MessageLog
-import exceptions
-import lzma
-import pickle
+import save_format
+from scheduler import TurnScheduler
+import numpy as np
 if TYPE_CHECKING:
+    from autosave import Autosaver
     from entities import Actor
     from map import DungeonMap, GameWorld
-    
+
+FOV_RADIUS = 8
+
 class Generator:
     dungeon_map: DungeonMap
     game_world: GameWorld
@@ -19,24 +22,42 @@ class Generator:
         self.player = player
         self.message_log = MessageLog()
         self.mouse_location = (0, 0)
-        
+        self._player_distance_map: Optional[np.ndarray] = None
+        self.autosaver: Optional[Autosaver] = None  # Only set for games played by a person.
+        self.scheduler = TurnScheduler()
+
+    @property
+    def player_distance_map(self) -> np.ndarray:
+        """A distance map rooted at the player, computed at most once per turn and shared by every pursuing monster."""
+        if self._player_distance_map is None:
+            self._player_distance_map = self.dungeon_map.compute_distance_map([(self.player.x, self.player.y)])
+        return self._player_distance_map
+
     def handle_monster_turns(self) -> None:
-        for entity in set(self.dungeon_map.actors) - {self.player}:
-            if entity.ai:
-                try:
-                    entity.ai.act()
-                except exceptions.Impossible:
-                    pass  # Ignore impossible action exceptions from AI.
+        self._player_distance_map = None  # The player has acted, so last turn's map is stale.
+        self.scheduler.run_turn(self)
+        self.dungeon_map.decay_corpses()
              
     
     def update(self) -> None: # Updates the fov of the player
-        self.dungeon_map.visible[:] = compute_fov(
-            self.dungeon_map.tiles["transparent"],
+        dungeon_map = self.dungeon_map
+        fov_key = (self.player.x, self.player.y, FOV_RADIUS, dungeon_map.tiles_version)
+        if fov_key == dungeon_map.fov_key:
+            # Nothing that affects sight changed since the last update, such as after waiting in place.
+            dungeon_map.visibility_changed[:] = False
+            return
+
+        visible = compute_fov(
+            dungeon_map.tiles["transparent"],
             (self.player.x, self.player.y),
-            radius = 8,
+            radius = FOV_RADIUS,
         )
+        np.not_equal(visible, dungeon_map.visible, out = dungeon_map.visibility_changed)
+        dungeon_map.visible[:] = visible
         # If a tile is in FOV it should be seen as encountered too.
-        self.dungeon_map.encountered |= self.dungeon_map.visible
+        dungeon_map.encountered |= visible
+        dungeon_map.mark_visibility_changed(dungeon_map.visibility_changed)
+        dungeon_map.fov_key = fov_key
         
     def make(self, console: Console) -> None:
         self.dungeon_map.make(console)
@@ -59,8 +80,8 @@ class Generator:
             console = console, x = 21, y = 44, generator = self
         )
         
-    def save_as(self, filename: str) -> None:
-        """Save this Generator instance as a compressed file."""
-        save_data = lzma.compress(pickle.dumps(self))
-        with open(filename, "wb") as f:
-            f.write(save_data)
\ No newline at end of file
+    def save_as(self, filename: str, codec: str = save_format.DEFAULT_CODEC) -> None:
+        """Save this game, `codec` is a key of save_format.CODECS."""
+        if self.autosaver is not None:
+            self.autosaver.wait()  # An older autosave must not replace this save.
+        save_format.save_game(self, filename, codec)
\ No newline at end of file
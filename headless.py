@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Run the game without a window, driving the player with a bot or a script, to soak-test and profile turns."""
+from __future__ import annotations
+import argparse
+import time
+from typing import Callable, Optional
+import action
+from action import Action
+import input_handler
+import setup
+from generator import Generator
+from map import NEIGHBOUR_OFFSETS
+
+ActionChooser = Callable[[Generator], Optional[Action]]
+"""Returns the players next action, or None to end the run.
+
+A script can be replayed with `lambda generator: next(actions, None)`.
+"""
+
+
+class SimulationResult:
+    def __init__(self) -> None:
+        self.turns = 0  # Actions which advanced the game.
+        self.impossible_actions = 0
+        self.deaths = 0
+        self.deepest_floor = 0
+        self.elapsed = 0.0
+
+    @property
+    def turns_per_second(self) -> float:
+        return self.turns / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.turns} turns in {self.elapsed:.2f}s ({self.turns_per_second:.0f} turns/s), "
+            f"{self.impossible_actions} impossible actions, {self.deaths} deaths, deepest floor {self.deepest_floor}"
+        )
+
+
+def bot_action(generator: Generator) -> Action:
+    """A simple player bot: fight whatever is adjacent, take items and head down the stairs."""
+    player = generator.player
+    dungeon_map = generator.dungeon_map
+
+    for dx, dy in NEIGHBOUR_OFFSETS:
+        if dungeon_map.get_actor_at_location(player.x + dx, player.y + dy):
+            return action.Attack(player, dx, dy)
+
+    if any(dungeon_map.get_items_at_location(player.x, player.y)):
+        if len(player.inventory.items) < player.inventory.capacity:
+            return action.PickupAction(player)
+
+    if (player.x, player.y) == dungeon_map.stairs_location:
+        return action.TakeStairs(player)
+
+    step = dungeon_map.get_downhill_step(
+        dungeon_map.compute_distance_map([dungeon_map.stairs_location]), player.x, player.y
+    )
+    if step:
+        return action.Movement(player, step[0] - player.x, step[1] - player.y)
+    return action.Wait(player)
+
+
+def new_headless_game(seed: Optional[int] = None) -> Generator:
+    generator = setup.new_game(seed)
+    generator.message_log.spill_filename = None  # Don't touch the spill file of a real game.
+    generator.autosaver = None  # Or its save file.
+    return generator
+
+
+def run(
+    choose_action: ActionChooser, turns: int, generator: Optional[Generator] = None, seed: Optional[int] = None,
+) -> SimulationResult:
+    """Play up to `turns` turns through the same `EventHandler.handle_action` path as the real game.
+
+    A new game is started whenever the player dies, seeded with `seed` plus the number of deaths so far,
+    and level ups always go to power.
+    """
+    result = SimulationResult()
+    if generator is None:
+        generator = new_headless_game(seed)
+    handler = input_handler.MainGameEventHandler(generator)
+
+    start = time.perf_counter()
+    while result.turns < turns:
+        if not generator.player.is_alive:
+            result.deaths += 1
+            generator = new_headless_game(None if seed is None else seed + result.deaths)
+            handler = input_handler.MainGameEventHandler(generator)
+
+        player_action = choose_action(generator)
+        if player_action is None:
+            break
+        if handler.handle_action(player_action):
+            result.turns += 1
+        else:
+            result.impossible_actions += 1
+
+        if generator.player.level.requires_level_up:
+            generator.player.level.increase_power()
+        result.deepest_floor = max(result.deepest_floor, generator.game_world.current_floor)
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument("--turns", type = int, default = 5000, help = "Number of turns to simulate.")
+    parser.add_argument("--seed", type = int, default = None, help = "Master seed of the first game.")
+    args = parser.parse_args()
+
+    print(run(bot_action, args.turns, seed = args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ from __future__ import annotations
 import os
 import libtcodpy
 from typing import Callable, Optional, Tuple, TYPE_CHECKING, Union
+import numpy as np
 import tcod
 import action
 from action import (
@@ -13,6 +14,7 @@ from action import (
 )
 import color
 import exceptions
+from message_log import MessageWindow
 if TYPE_CHECKING:
     from generator import Generator
     from entities import Item
@@ -146,6 +148,8 @@ class EventHandler(BaseEventHandler):
 
         self.generator.handle_monster_turns()
         self.generator.update()
+        if self.generator.autosaver is not None:
+            self.generator.autosaver.on_turn()
         return True
             
     def ev_mousemotion(self, event: tcod.event.MouseMotion) -> None:
@@ -537,8 +541,13 @@ class MainGameEventHandler(EventHandler):
 class GameOverEventHandler(EventHandler):
     def on_quit(self) -> None:
         """Handle exiting out of a finished game."""
+        if self.generator.autosaver is not None:
+            self.generator.autosaver.wait()  # Let an autosave from the last turns land before it is deleted.
         if os.path.exists("savegame.sav"):
             os.remove("savegame.sav")  # Deletes the active save file.
+        spill_filename = self.generator.message_log.spill_filename
+        if spill_filename and os.path.exists(spill_filename):
+            os.remove(spill_filename)  # And the old messages which went with it.
         raise exceptions.QuitWithoutSaving()  # Avoid saving a finished game.
 
     def ev_quit(self, event: tcod.event.Quit) -> None:
@@ -553,29 +562,45 @@ class HistoryViewer(EventHandler):
 
     def __init__(self, generator: Generator):
         super().__init__(generator)
-        self.log_length = len(generator.message_log.messages)
+        self.log_length = len(generator.message_log)
         self.cursor = self.log_length - 1
+        # The game can't change while the history is open, so the background and the log window are drawn once
+        # and only the log window is redrawn when the cursor moves.
+        self.background: Optional[np.ndarray] = None
+        self.log_console: Optional[tcod.console.Console] = None
+        self.rendered_cursor: Optional[int] = None
 
     def on_render(self, console: tcod.console.Console) -> None:
-        super().on_render(console)  # Draw the main state as the background.
-
-        log_console = tcod.console.Console(console.width - 6, console.height - 6)
-
-        # Draw a frame with a custom banner title.
-        log_console.draw_frame(0, 0, log_console.width, log_console.height)
-        log_console.print_box(
-            0, 0, log_console.width, 1, "┤Message history├", alignment = libtcodpy.CENTER
-        )
-
-        # Render the message log using the cursor parameter.
-        self.generator.message_log.render_messages(
-            log_console,
-            1,
-            1,
-            log_console.width - 2,
-            log_console.height - 2,
-            self.generator.message_log.messages[: self.cursor + 1],
-        )
+        if self.background is None or self.background.shape != console.rgb.shape:
+            super().on_render(console)  # Draw the main state as the background.
+            self.background = console.rgb.copy()
+        else:
+            console.rgb[...] = self.background
+
+        log_width, log_height = console.width - 6, console.height - 6
+        if self.log_console is None or (self.log_console.width, self.log_console.height) != (log_width, log_height):
+            self.log_console = tcod.console.Console(log_width, log_height)
+            self.rendered_cursor = None
+        log_console = self.log_console
+
+        if self.rendered_cursor != self.cursor:
+            log_console.clear()
+            # Draw a frame with a custom banner title.
+            log_console.draw_frame(0, 0, log_console.width, log_console.height)
+            log_console.print_box(
+                0, 0, log_console.width, 1, "┤Message history├", alignment = libtcodpy.CENTER
+            )
+
+            # Render the message log using the cursor parameter, only the messages which fit are loaded and wrapped.
+            self.generator.message_log.render_messages(
+                log_console,
+                1,
+                1,
+                log_console.width - 2,
+                log_console.height - 2,
+                MessageWindow(self.generator.message_log, self.cursor + 1),
+            )
+            self.rendered_cursor = self.cursor
         log_console.blit(console, 3, 3)
 
     def ev_keydown(self, event: tcod.event.KeyDown) -> Optional[MainGameEventHandler]:
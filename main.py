@@ -4,6 +4,7 @@ import tcod
 import color
 import exceptions
 import input_handler
+from frame_scheduler import FrameScheduler
 import setup
 from entities import Entity
 
@@ -29,17 +30,22 @@ def main() -> None:
         vsync = True,
     ) as context:
         root_console = tcod.console.Console(screen_width, screen_height, order = "F")
+        scheduler = FrameScheduler()
         try:
             while True:
-                root_console.clear()
-                handler.on_render(console = root_console)
-                context.present(root_console)
+                if scheduler.begin_frame():  # Skip drawing when nothing on screen could have changed.
+                    root_console.clear()
+                    handler.on_render(console = root_console)
+                    context.present(root_console)
 
                 try:
                     for event in tcod.event.wait():
                         context.convert_event(event)
+                        previous_handler = handler
                         handler = handler.handle(event)
+                        scheduler.on_event(event, previous_handler, handler)
                 except Exception:  # Handle exceptions in game.
+                    scheduler.mark_dirty()
                     traceback.print_exc()  # Print error to stderr.
                     # Then print the error to the message log.
                     if isinstance(handler, input_handler.EventHandler):
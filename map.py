@@ -1,24 +1,84 @@
 from __future__ import annotations
-from typing import Iterable, Iterator, Optional, TYPE_CHECKING
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+import random
+import traceback
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple, TYPE_CHECKING
 import numpy as np  # type: ignore
+import tcod
 from tcod.console import Console
 from entity_list import Actor, Item
+from entity_store import EntityStore
+from floor_store import FloorStore
 import tile_types
 if TYPE_CHECKING:
     from generator import Generator
     from entities import Entity
 
 
+UNREACHABLE = np.iinfo(np.int32).max  # Distance map value of tiles which can't reach any goal.
+
+# Cardinal directions come first so that ties are broken with straight moves.
+NEIGHBOUR_OFFSETS = ((0, -1), (-1, 0), (1, 0), (0, 1), (-1, -1), (1, -1), (-1, 1), (1, 1))
+
+# Added to the cost of a tile with a blocking entity on it.
+# A lower number means more enemies will crowd behind each other in
+# hallways.  A higher number means enemies will take longer paths in
+# order to surround the player.
+BLOCKING_ENTITY_COST = 10
+
+# Entity glyphs ready to be written into Console.rgb in a single assignment.
+glyph_dt = np.dtype([("x", np.intp), ("y", np.intp), ("ch", np.int32), ("fg", "3B")])
+
+BLOCKING_CHANGE_HISTORY = 256  # How many recent blocking changes are remembered for path invalidation.
+
+# Dead monsters are kept as a glyph per tile instead of as entities, `turns_left` is -1 for corpses which never decay.
+corpse_dt = np.dtype([("ch", np.int32), ("fg", "3B"), ("turns_left", np.int32)])
+CORPSE_DECAY_TURNS: Optional[int] = 300  # Turns until a corpse rots away, None keeps them for the rest of the floor.
+
+
 class DungeonMap:
     def __init__(self, generator: Generator, width: int, height: int, entities: Iterable[Entity] = ()):
         self.generator = generator
         self.width = width
         self.height = height
-        self.entities = set(entities)
+        self.entities: Set[Entity] = set()
+        # The entities split by kind, kept up to date as they spawn, die, are picked up and dropped.
+        # The only dead actor kept as an entity is the player, which is in neither.
+        # Dicts are used as insertion ordered sets.
+        self.living_actors: Dict[Actor, None] = {}
+        self.floor_items: Dict[Item, None] = {}
+        self.corpse_layer = np.zeros((width, height), dtype = corpse_dt, order = "F")
+        self.corpse_names: Dict[Tuple[int, int], str] = {}  # Also the set of tiles with a corpse.
+        # Spatial index of the entities on this map, keyed by tile, so that location lookups don't scan every entity.
+        self.entities_by_location: Dict[Tuple[int, int], Set[Entity]] = {}
+        # Positions, hit points and flags of the entities as arrays, also where the location index finds old positions.
+        self.entity_store = EntityStore()
         self.tiles = np.full((width, height), fill_value = tile_types.wall, order = "F")
         self.visible = np.full((width, height), fill_value = False, order = "F")
         self.encountered = np.full((width, height), fill_value = False, order = "F")
+        # Tiles whose visibility flipped during the last FOV update.
+        self.visibility_changed = np.full((width, height), fill_value = False, order = "F")
+        # Bumped whenever `tiles` is edited, so anything derived from them knows to refresh.
+        self.tiles_version = 0
+        # The (x, y, radius, tiles_version) the current `visible` array was computed for.
+        self.fov_key: Optional[Tuple[int, int, int, int]] = None
+        # Composited light/dark/void graphics, rebuilt when the tiles change and patched where `graphics_dirty` is set.
+        self.tile_graphics: Optional[np.ndarray] = None
+        self.tile_graphics_version = -1
+        self.graphics_dirty = np.full((width, height), fill_value = False, order = "F")
+        # The top most glyph of every occupied tile, rebuilt only after entities move, come, go or change appearance.
+        self.entity_glyphs: Optional[np.ndarray] = None
         self.stairs_location = (0, 0)
+        self.player_start = (0, 0)  # Where the player enters this floor.
+        # Built from the tiles on first use, then kept up to date in place as blocking entities come and go.
+        self.cost_map: Optional[np.ndarray] = None
+        # Tiles where blocking entities recently appeared or left, `blocking_version` counts every change ever made.
+        self.blocking_changes: Deque[Tuple[int, int]] = deque(maxlen = BLOCKING_CHANGE_HISTORY)
+        self.blocking_version = 0
+        for entity in entities:
+            self.add_entity(entity)
     
     @property
     def dungeon_map(self) -> DungeonMap:
@@ -26,47 +86,279 @@ class DungeonMap:
      
     @property
     def actors(self) -> Iterator[Actor]:
-        """Iterate over this maps living actors."""
-        yield from (
-            entity for entity in self.entities
-            if isinstance(entity, Actor) and entity.is_alive
-        )
+        """Iterate over this maps living actors, actors may die while this is iterated."""
+        yield from list(self.living_actors)
+
+    def get_actors_within_radius(self, x: int, y: int, radius: float) -> List[Actor]:
+        """Return the living actors no further than `radius` from (x, y)."""
+        store = self.entity_store
+        return store.select(store.alive & store.within_radius(x, y, radius))  # type: ignore[return-value]
+
+    def get_visible_actors(self) -> List[Actor]:
+        """Return the living actors standing on tiles the player can see."""
+        store = self.entity_store
+        return store.select(store.alive & store.visible(self.visible))  # type: ignore[return-value]
     
     @property
     def items(self) -> Iterator[Item]:
-        yield from (entity for entity in self.entities if isinstance(entity, Item))
+        yield from list(self.floor_items)
+
+    def _register(self, entity: Entity) -> None:
+        if isinstance(entity, Actor):
+            if entity.is_alive:
+                self.living_actors[entity] = None
+        elif isinstance(entity, Item):
+            self.floor_items[entity] = None
+
+    def _unregister(self, entity: Entity) -> None:
+        self.living_actors.pop(entity, None)  # type: ignore[call-overload]
+        self.floor_items.pop(entity, None)  # type: ignore[call-overload]
     
+    def add_entity(self, entity: Entity) -> None:
+        """Add an entity to this map and index it at its current location."""
+        if entity in self.entities:
+            self.update_entity_location(entity)
+            return
+        self.entities.add(entity)
+        self._register(entity)
+        location = (entity.x, entity.y)
+        self.entity_store.add(entity)
+        self.entities_by_location.setdefault(location, set()).add(entity)
+        self.entity_glyphs = None
+        if entity.blocks_movement:
+            self.change_blocking(*location, 1)
+
+    def remove_entity(self, entity: Entity) -> None:
+        """Remove an entity from this map and from the location index."""
+        self.entities.remove(entity)
+        self._unregister(entity)
+        location = self.entity_store.location(entity)
+        self.entity_store.remove(entity)
+        self._unindex(entity, location)
+        self.entity_glyphs = None
+        if entity.blocks_movement:
+            self.change_blocking(*location, -1)
+
+    def update_entity_location(self, entity: Entity) -> None:
+        """Move an entity to its current (x, y) within the location index, call after changing its position."""
+        old_location = self.entity_store.location(entity)
+        new_location = (entity.x, entity.y)
+        if old_location == new_location:
+            return
+        self._unindex(entity, old_location)
+        self.entity_store.move(entity)
+        self.entities_by_location.setdefault(new_location, set()).add(entity)
+        self.entity_glyphs = None
+        if entity.blocks_movement:
+            self.change_blocking(*old_location, -1)
+            self.change_blocking(*new_location, 1)
+
+    def _unindex(self, entity: Entity, location: Tuple[int, int]) -> None:
+        entities_at_location = self.entities_by_location[location]
+        entities_at_location.discard(entity)
+        if not entities_at_location:  # Drop empty tiles so the index only holds occupied locations.
+            del self.entities_by_location[location]
+
+    def get_entities_at_location(self, x: int, y: int) -> Iterator[Entity]:
+        """Iterate over every entity at the given location."""
+        yield from self.entities_by_location.get((x, y), ())
+
+    def is_occupied(self, x: int, y: int) -> bool:
+        """Return True if any entity is at the given location."""
+        return (x, y) in self.entities_by_location
+
     def get_blocking_entity_at_location(self, location_x: int, location_y: int) -> Optional[Entity]:
-        for entity in self.entities:
-            if entity.blocks_movement and entity.x == location_x and entity.y == location_y:
+        for entity in self.get_entities_at_location(location_x, location_y):
+            if entity.blocks_movement:
                 return entity
 
         return None
     
     def get_actor_at_location(self, x: int, y: int) -> Optional[Actor]:
-        for actor in self.actors:
-            if actor.x == x and actor.y == y:
-                return actor
+        for entity in self.get_entities_at_location(x, y):
+            if entity in self.living_actors:
+                return entity  # type: ignore[return-value]
         return None
 
+    def get_items_at_location(self, x: int, y: int) -> Iterator[Item]:
+        yield from (entity for entity in self.get_entities_at_location(x, y) if entity in self.floor_items)  # type: ignore[misc]
+
     def bounds_check(self, x: int, y: int) -> bool:
         return 0 <= x < self.width and 0 <= y < self.height
 
-    def make(self, console: Console) -> None:
-        console.rgb[0:self.width, 0:self.height] = np.select(
-            condlist = [self.visible, self.encountered],
-            choicelist = [self.tiles["light"], self.tiles["dark"]],
+    def mark_tiles_changed(self) -> None:
+        """Call after editing `tiles` so that cached FOV and pathfinding costs are rebuilt."""
+        self.tiles_version += 1
+        self.cost_map = None
+
+    def change_blocking(self, x: int, y: int, amount: int) -> None:
+        """Record that `amount` blocking entities arrived at (x, y), or left it if negative."""
+        if self.cost_map is not None and self.tiles["walkable"][x, y]:
+            self.cost_map[x, y] += amount * BLOCKING_ENTITY_COST
+        self.blocking_changes.append((x, y))
+        self.blocking_version += 1
+
+    def blocking_changed_since(self, version: int, locations: Iterable[Tuple[int, int]]) -> bool:
+        """Return True if a blocking entity arrived at or left any of `locations` after `blocking_version` was `version`."""
+        missed = self.blocking_version - version
+        if missed == 0:
+            return False
+        if missed > len(self.blocking_changes):
+            return True  # Too old to tell, assume the worst.
+        changed = set(islice(reversed(self.blocking_changes), missed))
+        return any(location in changed for location in locations)
+
+    def get_cost_map(self) -> np.ndarray:
+        """Return the movement cost of every tile, walls are 0 and tiles with blocking entities cost extra.
+
+        The array is shared and updated in place, it must not be modified by the caller.
+        """
+        if self.cost_map is None:
+            self.cost_map = np.array(self.tiles["walkable"], dtype = np.int8, order = "F")
+            store = self.entity_store
+            blocking = store.in_use & store.blocks_movement
+            xs, ys = store.x[blocking], store.y[blocking]
+            # Blocking entities add to the cost of their tile unless it is a wall, with a cost of zero.
+            walkable = self.cost_map[xs, ys] != 0
+            np.add.at(self.cost_map, (xs[walkable], ys[walkable]), BLOCKING_ENTITY_COST)
+        return self.cost_map
+
+    def compute_distance_map(self, goals: Iterable[Tuple[int, int]]) -> np.ndarray:
+        """Return a Dijkstra map holding the travel cost from every tile to the nearest of the `goals`.
+
+        Unreachable tiles hold `UNREACHABLE`. Any number of actors can share one map by stepping downhill.
+        """
+        distance = tcod.path.maxarray((self.width, self.height), dtype = np.int32, order = "F")
+        for goal in goals:
+            distance[goal] = 0
+        return tcod.path.dijkstra2d(distance, self.get_cost_map(), 2, 3, out = distance)
+
+    def compute_flee_map(self, distance_map: np.ndarray) -> np.ndarray:
+        """Return a Dijkstra map which leads away from the goals of `distance_map`.
+
+        Stepping downhill on the result moves towards the safest tiles instead of simply the furthest corner.
+        """
+        reachable = distance_map != UNREACHABLE
+        flee = np.full_like(distance_map, UNREACHABLE)
+        flee[reachable] = distance_map[reachable] * -6 // 5
+        return tcod.path.dijkstra2d(flee, self.get_cost_map(), 2, 3, out = flee)
+
+    def get_downhill_step(self, distance_map: np.ndarray, x: int, y: int) -> Optional[Tuple[int, int]]:
+        """Return the unblocked neighbour of (x, y) with the lowest distance, or None if no step gets closer."""
+        best_step = None
+        best_distance = distance_map[x, y]
+        for dx, dy in NEIGHBOUR_OFFSETS:
+            step_x, step_y = x + dx, y + dy
+            if not self.bounds_check(step_x, step_y):
+                continue
+            if distance_map[step_x, step_y] < best_distance and not self.get_blocking_entity_at_location(step_x, step_y):
+                best_step = step_x, step_y
+                best_distance = distance_map[step_x, step_y]
+        return best_step
+
+    def mark_visibility_changed(self, changed: np.ndarray) -> None:
+        """Flag tiles whose visibility or exploration state changed so their graphics are recomposited."""
+        self.graphics_dirty |= changed
+
+    def _composite_tiles(self, region: Tuple[slice, slice]) -> np.ndarray:
+        return np.select(
+            condlist = [self.visible[region], self.encountered[region]],
+            choicelist = [self.tiles["light"][region], self.tiles["dark"][region]],
             default = tile_types.VOID,
         )
-        
-        entities_sorted_for_rendering = sorted(
-            self.entities, key = lambda x: x.render_order.value
-        )
-        for entity in entities_sorted_for_rendering:
-            if self.visible[entity.x, entity.y]:
-                console.print(
-                    x = entity.x, y = entity.y, string = entity.char, fg = entity.color
+
+    def get_tile_graphics(self) -> np.ndarray:
+        """Return the composited tile graphics, only recompositing the region which changed since the last call."""
+        if self.tile_graphics is None or self.tile_graphics_version != self.tiles_version:
+            self.tile_graphics = self._composite_tiles((slice(None), slice(None)))
+            self.tile_graphics_version = self.tiles_version
+        else:
+            dirty_columns = np.flatnonzero(self.graphics_dirty.any(axis = 1))
+            if dirty_columns.size:
+                dirty_rows = np.flatnonzero(self.graphics_dirty.any(axis = 0))
+                region = (
+                    slice(dirty_columns[0], dirty_columns[-1] + 1),
+                    slice(dirty_rows[0], dirty_rows[-1] + 1),
                 )
+                self.tile_graphics[region] = self._composite_tiles(region)
+        self.graphics_dirty[:] = False
+        return self.tile_graphics
+
+    def mark_appearance_changed(self) -> None:
+        """Call after changing an entities char, color or render order so its glyph is redrawn."""
+        self.entity_glyphs = None
+
+    def update_entity_state(self, entity: Entity) -> None:
+        """Copy an entities hit points, flags and render order into the entity store, call after changing them.
+
+        An actor which died is removed from the living actors.
+        """
+        self.entity_store.update(entity)
+        if isinstance(entity, Actor) and (entity in self.living_actors) != entity.is_alive:
+            self._unregister(entity)
+            self._register(entity)
+
+    def add_corpse(self, actor: Actor) -> None:
+        """Replace a dead actor with a glyph in the corpse layer, anything it carried is dropped on its tile."""
+        location = actor.x, actor.y
+        for item in list(actor.inventory.items):
+            actor.inventory.items.remove(item)
+            item.place(actor.x, actor.y, self)
+        self.remove_entity(actor)
+        self.corpse_layer[location] = ord(actor.char), actor.color, -1 if CORPSE_DECAY_TURNS is None else CORPSE_DECAY_TURNS
+        self.corpse_names[location] = actor.name
+
+    def decay_corpses(self) -> None:
+        """Age every corpse by a turn and remove the ones which rotted away."""
+        if not self.corpse_names:
+            return
+        turns_left = self.corpse_layer["turns_left"]
+        turns_left[turns_left > 0] -= 1
+        rotted = (turns_left == 0) & (self.corpse_layer["ch"] != 0)
+        if rotted.any():
+            self.corpse_layer[rotted] = 0
+            for x, y in zip(*np.nonzero(rotted)):
+                del self.corpse_names[int(x), int(y)]
+
+    def get_entity_glyphs(self) -> np.ndarray:
+        """Return the glyph drawn on each occupied tile, the entity with the highest render order wins."""
+        if self.entity_glyphs is None:
+            entities_sorted_for_rendering = sorted(
+                self.entities, key = lambda x: x.render_order.value
+            )
+            glyphs = np.array(
+                [(entity.x, entity.y, ord(entity.char), entity.color) for entity in entities_sorted_for_rendering],
+                dtype = glyph_dt,
+            )
+            # Keep the last glyph drawn on each tile, as later glyphs are drawn over the earlier ones.
+            tile_indexes = glyphs["x"] * self.height + glyphs["y"]
+            _, last_from_end = np.unique(tile_indexes[::-1], return_index = True)
+            self.entity_glyphs = glyphs[len(glyphs) - 1 - last_from_end]
+        return self.entity_glyphs
+
+    def make(self, console: Console) -> None:
+        console.rgb[0:self.width, 0:self.height] = self.get_tile_graphics()
+
+        if self.corpse_names:
+            corpses = self.visible & (self.corpse_layer["ch"] != 0)
+            console.rgb["ch"][0:self.width, 0:self.height][corpses] = self.corpse_layer["ch"][corpses]
+            console.rgb["fg"][0:self.width, 0:self.height][corpses] = self.corpse_layer["fg"][corpses]
+
+        glyphs = self.get_entity_glyphs()
+        glyphs = glyphs[self.visible[glyphs["x"], glyphs["y"]]]
+        console.rgb["ch"][glyphs["x"], glyphs["y"]] = glyphs["ch"]
+        console.rgb["fg"][glyphs["x"], glyphs["y"]] = glyphs["fg"]
+
+prefetch_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_prefetch_executor() -> ThreadPoolExecutor:
+    """The worker thread which floors are prefetched on, it mostly runs while the main thread waits for input."""
+    global prefetch_executor
+    if prefetch_executor is None:
+        prefetch_executor = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = "floor-prefetch")
+    return prefetch_executor
+
 
 class GameWorld:
     """
@@ -82,7 +374,10 @@ class GameWorld:
         max_rooms: int,
         min_room_size: int,
         max_room_size: int,
-        current_floor: int = 0
+        current_floor: int = 0,
+        layout: str = "scatter",
+        seed: Optional[int] = None,
+        prefetch: bool = True,
     ):
         self.generator = generator
         self.map_width = map_width
@@ -91,16 +386,91 @@ class GameWorld:
         self.min_room_size = min_room_size
         self.max_room_size = max_room_size
         self.current_floor = current_floor
+        self.layout = layout  # A key of procedure_gen.ROOM_LAYOUTS.
+        # Master seed of the whole run, every floor and subsystem derives its own random stream from it.
+        self.seed = seed if seed is not None else random.SystemRandom().getrandbits(64)
+        self.ai_rng = self.floor_rng(current_floor, "ai")
+        # The floor being built in the background, with its job.
+        self.prefetch = prefetch
+        self.prefetched_floor: Optional[Tuple[int, Future[DungeonMap]]] = None
+        # Every visited floor other than the current one.
+        self.floors = FloorStore(generator)
 
-    def generate_floor(self) -> None:
+    def floor_rng(self, floor: int, stream: str) -> random.Random:
+        """Return a new random stream for one subsystem of one floor.
+
+        Streams only depend on the master seed, the floor and the stream name, so the same seed
+        gives the same floors in any process and in any order the floors are generated.
+        """
+        # String seeds are hashed with SHA-512, unlike hash() they don't change between processes.
+        return random.Random(f"{self.seed}/{floor}/{stream}")
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        state["prefetched_floor"] = None  # A pending background job can't be saved, it is restarted on load.
+        return state
+
+    def build_floor(self, floor: int) -> DungeonMap:
+        """Generate the given floor without entering it, this is safe to call from a worker thread."""
         from procedure_gen import generate_dungeon
-        self.current_floor += 1
 
-        self.generator.dungeon_map = generate_dungeon(
+        return generate_dungeon(
             max_rooms = self.max_rooms,
             min_room_size = self.min_room_size,
             max_room_size = self.max_room_size,
             map_width = self.map_width,
             map_height = self.map_height,
             generator = self.generator,
-        )
\ No newline at end of file
+            layout = self.layout,
+            floor = floor,
+            layout_rng = self.floor_rng(floor, "layout"),
+            spawn_rng = self.floor_rng(floor, "spawns"),
+        )
+
+    def prefetch_next_floor(self) -> None:
+        """Start building the next floor in the background while the player explores this one."""
+        floor = self.current_floor + 1
+        if not self.prefetch or floor in self.floors:
+            return
+        if self.prefetched_floor is None or self.prefetched_floor[0] != floor:
+            self.prefetched_floor = floor, get_prefetch_executor().submit(self.build_floor, floor)
+
+    def take_prefetched_floor(self, floor: int) -> Optional[DungeonMap]:
+        """Return the prefetched map of `floor`, or None if it wasn't prefetched or isn't started yet."""
+        if self.prefetched_floor is None:
+            return None
+        prefetched_floor, future = self.prefetched_floor
+        self.prefetched_floor = None
+        if prefetched_floor != floor or future.cancel():
+            return None  # Never started, generating it here is just as fast.
+        try:
+            # Already done, or halfway there, in which case finishing it beats starting over.
+            return future.result()
+        except Exception:
+            traceback.print_exc()  # Print error to stderr, then generate the floor normally.
+            return None
+
+    def generate_floor(self) -> None:
+        self.go_to_floor(self.current_floor + 1)
+
+    def go_to_floor(self, floor: int) -> None:
+        """Move the player to `floor`, restoring it if it was visited before and generating it otherwise.
+
+        The floor being left is kept in the floor store.
+        """
+        previous_floor = self.current_floor
+        previous_map: Optional[DungeonMap] = getattr(self.generator, "dungeon_map", None)
+
+        dungeon_map = self.floors.take(floor)
+        if dungeon_map is None:
+            dungeon_map = self.take_prefetched_floor(floor)
+        if dungeon_map is None:
+            dungeon_map = self.build_floor(floor)
+        # Floors are seeded, so a prefetched floor is identical to one generated right now.
+        self.current_floor = floor
+        self.generator.dungeon_map = dungeon_map
+        self.generator.player.place(*dungeon_map.player_start, dungeon_map)
+        if previous_map is not None:
+            self.floors.put(previous_floor, previous_map)
+        self.ai_rng = self.floor_rng(self.current_floor, "ai")
+        self.prefetch_next_floor()
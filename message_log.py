@@ -1,14 +1,32 @@
-from typing import Iterable, List, Reversible, Tuple
+from collections import deque
+from itertools import islice
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Reversible, Tuple
+import json
 import textwrap
 import tcod
 import color
 
+MESSAGE_CAPACITY = 1000  # Messages kept in memory, older ones are spilled to disk.
+SPILL_FILENAME = "message_history.log"
+SPILL_PAGE_SIZE = 64  # Messages are written to and read back from the spill file in pages of this size.
+CACHED_SPILL_PAGES = 4
+
 
 class Message:
-    def __init__(self, text: str, fg: Tuple[int, int, int]):
-        self.plain_text = text
+    def __init__(self, text: str, fg: Tuple[int, int, int], args: Tuple[Any, ...] = ()):
+        # With `args` the text is a str.format template, only formatted once the message is shown.
+        self.template = text
+        self.args = args
         self.fg = fg
         self.count = 1
+        # Wrapped lines keyed by width, along with the count they were wrapped for.
+        self.wrapped_lines: Dict[int, Tuple[int, List[str]]] = {}
+
+    @property
+    def plain_text(self) -> str:
+        if self.args:
+            return self.template.format(*self.args)
+        return self.template
 
     @property
     def full_text(self) -> str:
@@ -16,21 +34,119 @@ class Message:
             return f"{self.plain_text} (x{self.count})"
         return self.plain_text
 
+    def wrap(self, width: int) -> List[str]:
+        """Return this message wrapped to `width`, only rewrapping when the width is new or the count changed."""
+        cached = self.wrapped_lines.get(width)
+        if cached is None or cached[0] != self.count:
+            cached = self.count, list(MessageLog.wrap(self.full_text, width))
+            self.wrapped_lines[width] = cached
+        return cached[1]
+
+
+class MessageWindow:
+    """A lazy reversible view over the first `stop` messages of a log, which only loads what is iterated."""
+
+    def __init__(self, message_log: "MessageLog", stop: int):
+        self.message_log = message_log
+        self.stop = stop
+
+    def __reversed__(self) -> Iterator[Message]:
+        return self.message_log.reversed_messages(self.stop)
+
 
 class MessageLog:
-    def __init__(self) -> None:
-        self.messages: List[Message] = []
+    def __init__(self, capacity: int = MESSAGE_CAPACITY, spill_filename: Optional[str] = SPILL_FILENAME) -> None:
+        # The newest messages, in memory.
+        self.messages: Deque[Message] = deque(maxlen = capacity)
+        # Older messages are appended to `spill_filename` a page at a time, or forgotten if it is None.
+        self.spill_filename = spill_filename
+        self.spill_buffer: List[Message] = []
+        self.spill_page_offsets: List[int] = []
+        self.spill_page_cache: Dict[int, List[Message]] = {}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        state["spill_page_cache"] = {}  # Pages can be read back from the spill file, don't save them.
+        return state
+
+    def __len__(self) -> int:
+        """The number of messages in the whole history, including the ones spilled to disk."""
+        return len(self.spill_page_offsets) * SPILL_PAGE_SIZE + len(self.spill_buffer) + len(self.messages)
 
-    def add_message(self, text: str, fg: Tuple[int, int, int] = color.white, *, stack: bool = True,) -> None:
+    def add_message(
+        self, text: str, fg: Tuple[int, int, int] = color.white, *, stack: bool = True, args: Tuple[Any, ...] = (),
+    ) -> None:
         """Add a message to this log.
         `text` is the message text, `fg` is the text color.
+        If `args` are given then `text` is a str.format template which is only
+        formatted when the message is shown.
         If `stack` is True then the message can stack with a previous message
         of the same text.
         """
-        if stack and self.messages and text == self.messages[-1].plain_text:
+        if stack and self.messages and text == self.messages[-1].template and args == self.messages[-1].args:
             self.messages[-1].count += 1
         else:
-            self.messages.append(Message(text, fg))
+            if len(self.messages) == self.messages.maxlen:
+                self.spill(self.messages[0])  # About to be pushed out of memory.
+            self.messages.append(Message(text, fg, args))
+
+    def spill(self, message: Message) -> None:
+        """Queue a message for the spill file, writing a page once enough are queued."""
+        if self.spill_filename is None:
+            return
+        self.spill_buffer.append(message)
+        if len(self.spill_buffer) < SPILL_PAGE_SIZE:
+            return
+
+        # A new game starts a new spill file, later pages are appended to it.
+        with open(self.spill_filename, "ab" if self.spill_page_offsets else "wb") as f:
+            self.spill_page_offsets.append(f.tell())
+            f.writelines(
+                json.dumps([message.plain_text, message.fg, message.count]).encode() + b"\n"
+                for message in self.spill_buffer
+            )
+        self.spill_buffer = []
+
+    def read_spill_page(self, page: int) -> List[Message]:
+        """Return a page of spilled messages, reading it from disk if it isn't cached."""
+        messages = self.spill_page_cache.get(page)
+        if messages is not None:
+            return messages
+
+        messages = []
+        try:
+            with open(self.spill_filename, "rb") as f:  # type: ignore
+                f.seek(self.spill_page_offsets[page])
+                for line in islice(f, SPILL_PAGE_SIZE):
+                    text, fg, count = json.loads(line)
+                    message = Message(text, tuple(fg))
+                    message.count = count
+                    messages.append(message)
+        except (OSError, ValueError):
+            pass
+        # Pad out pages which were lost, such as when another game replaced the spill file.
+        while len(messages) < SPILL_PAGE_SIZE:
+            messages.append(Message("<Message lost>", color.impossible))
+
+        if len(self.spill_page_cache) >= CACHED_SPILL_PAGES:
+            self.spill_page_cache.clear()
+        self.spill_page_cache[page] = messages
+        return messages
+
+    def get_message(self, index: int) -> Message:
+        """Return the message at `index` of the whole history."""
+        spilled = len(self.spill_page_offsets) * SPILL_PAGE_SIZE
+        if index < spilled:
+            return self.read_spill_page(index // SPILL_PAGE_SIZE)[index % SPILL_PAGE_SIZE]
+        index -= spilled
+        if index < len(self.spill_buffer):
+            return self.spill_buffer[index]
+        return self.messages[index - len(self.spill_buffer)]
+
+    def reversed_messages(self, stop: int) -> Iterator[Message]:
+        """Iterate backwards over the history, starting just before `stop`."""
+        for index in range(stop - 1, -1, -1):
+            yield self.get_message(index)
 
     def render(self, console: tcod.console.Console, x: int, y: int, width: int, height: int,) -> None:
         """Render this log over the given area.
@@ -64,8 +180,9 @@ class MessageLog:
         y_offset = height - 1
 
         for message in reversed(messages):
-            for line in reversed(list(cls.wrap(message.full_text, width))):
+            # Only the last lines of a message fit when it reaches the top.
+            for line in reversed(message.wrap(width)[-(y_offset + 1):]):
                 console.print(x, y + y_offset, line, message.fg)
                 y_offset -= 1
-                if y_offset < 0:
-                    return  # No more space to print messages.
\ No newline at end of file
+            if y_offset < 0:
+                return  # No more space to print messages.
\ No newline at end of file
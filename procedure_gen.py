@@ -1,6 +1,8 @@
 from __future__ import annotations
+import functools
 import random
 from typing import Iterator, List, Tuple, TYPE_CHECKING, Dict
+import numpy as np
 import tcod
 import entity_list
 from map import DungeonMap
@@ -37,23 +39,37 @@ def get_max_value_for_floor(max_value_by_floor: List[Tuple[int, int]], floor: in
             current_value = value
     return current_value
 
-def get_entities_at_random(weighted_chances_by_floor: Dict[int, List[Tuple[Entity, int]]],
-    number_of_entities: int, floor: int,) -> List[Entity]:
-    entity_weighted_chances = {}
+class SpawnTable:
+    """The entities which can spawn on one floor, with their cumulative weights so a pick is a single lookup."""
+    def __init__(self, weighted_chances_by_floor: Dict[int, List[Tuple[Entity, int]]], floor: int):
+        entity_weighted_chances: Dict[Entity, int] = {}
 
-    for key, values in weighted_chances_by_floor.items():
-        if key > floor:
-            break
-        else:
-            for value in values:
-                entity = value[0]
-                weighted_chance = value[1]
+        for key, values in weighted_chances_by_floor.items():
+            if key > floor:
+                break
+            for entity, weighted_chance in values:
                 entity_weighted_chances[entity] = weighted_chance
 
-    entities = list(entity_weighted_chances.keys())
-    entity_weighted_chance_values = list(entity_weighted_chances.values())
-    chosen_entities = random.choices(entities, weights = entity_weighted_chance_values, k = number_of_entities)
-    return chosen_entities
+        self.entities: List[Entity] = list(entity_weighted_chances.keys())
+        self.cumulative_weights = np.cumsum(list(entity_weighted_chances.values()), dtype = np.float64)
+
+    def choose(self, rng: np.random.Generator, number_of_entities: int) -> np.ndarray:
+        """Return the indexes into `entities` of `number_of_entities` weighted picks."""
+        if not self.entities:
+            return np.zeros(0, dtype = np.intp)
+        return np.searchsorted(
+            self.cumulative_weights, rng.random(number_of_entities) * self.cumulative_weights[-1], side = "right"
+        )
+
+@functools.lru_cache(maxsize = None)
+def get_spawn_tables(floor: int) -> Tuple[int, SpawnTable, int, SpawnTable]:
+    """Compile the spawn tables of a floor once, returns the monster limit and table, then the item limit and table."""
+    return (
+        get_max_value_for_floor(max_monsters_by_floor, floor),
+        SpawnTable(enemy_chances, floor),
+        get_max_value_for_floor(max_items_by_floor, floor),
+        SpawnTable(item_chances, floor),
+    )
 
 class RectRoom:
     def __init__(self, x: int, y: int, width: int, height: int):
@@ -76,23 +92,43 @@ class RectRoom:
         return (self.x1 <= other.x2 and self.x2 >= other.x1 and
                 self.y1 <= other.y2 and self.y2 >= other.y1)
     
-def spawn_entities(room: RectRoom, dungeon: DungeonMap, floor_number: int,) -> None:
-    number_of_monsters = random.randint(0, get_max_value_for_floor(max_monsters_by_floor, floor_number))
-    number_of_items = random.randint(0, get_max_value_for_floor(max_items_by_floor, floor_number))
-    monsters: List[Entity] = get_entities_at_random(enemy_chances, number_of_monsters, floor_number)
-    items: List[Entity] = get_entities_at_random(item_chances, number_of_items, floor_number)
-    
-    for entity in monsters + items:
-        x = random.randint(room.x1 + 1, room.x2 - 1)
-        y = random.randint(room.y1 + 1, room.y2 - 1)
-        if not any(entity.x == x and entity.y == y for entity in dungeon.entities):
-            entity.spawn(dungeon, x, y)
+def spawn_entities(rooms: List[RectRoom], dungeon: DungeonMap, floor_number: int, rng: np.random.Generator) -> None:
+    """Populate every room of a floor, the counts, picks and positions of all rooms are drawn in one batch."""
+    max_monsters, monster_table, max_items, item_table = get_spawn_tables(floor_number)
+    number_of_monsters = rng.integers(0, max_monsters, size = len(rooms), endpoint = True)
+    number_of_items = rng.integers(0, max_items, size = len(rooms), endpoint = True)
+    monsters = monster_table.choose(rng, int(number_of_monsters.sum()))
+    items = item_table.choose(rng, int(number_of_items.sum()))
+
+    # Each room spawns its monsters then its items, give every spawn a position inside its room.
+    spawns_per_room = number_of_monsters + number_of_items
+    room_indexes = np.repeat(np.arange(len(rooms)), spawns_per_room)
+    x1 = np.array([room.x1 for room in rooms], dtype = np.intp)
+    y1 = np.array([room.y1 for room in rooms], dtype = np.intp)
+    x2 = np.array([room.x2 for room in rooms], dtype = np.intp)
+    y2 = np.array([room.y2 for room in rooms], dtype = np.intp)
+    xs = rng.integers(x1[room_indexes] + 1, x2[room_indexes]).tolist()
+    ys = rng.integers(y1[room_indexes] + 1, y2[room_indexes]).tolist()
+
+    monster_offset = item_offset = spawn = 0
+    for room_monsters, room_items in zip(number_of_monsters.tolist(), number_of_items.tolist()):
+        room_entities = (
+            [monster_table.entities[i] for i in monsters[monster_offset:monster_offset + room_monsters].tolist()]
+            + [item_table.entities[i] for i in items[item_offset:item_offset + room_items].tolist()]
+        )
+        monster_offset += room_monsters
+        item_offset += room_items
+        for entity in room_entities:
+            x, y = xs[spawn], ys[spawn]
+            spawn += 1
+            if not dungeon.is_occupied(x, y) and (x, y) != dungeon.player_start:
+                entity.spawn(dungeon, x, y)
         
 
-def L_tunnel(begin: Tuple[int, int], end: Tuple[int, int]) -> Iterator[Tuple[int, int]]:
+def L_tunnel(begin: Tuple[int, int], end: Tuple[int, int], rng: random.Random) -> Iterator[Tuple[int, int]]:
     x1, y1 = begin
     x2, y2 = end
-    if random.random() < 0.5:  # Move horizontally, then vertically.
+    if rng.random() < 0.5:  # Move horizontally, then vertically.
         corner_x, corner_y = x2, y1
     else:                      # Move vertically, then horizontally.
         corner_x, corner_y = x1, y2
@@ -104,43 +140,102 @@ def L_tunnel(begin: Tuple[int, int], end: Tuple[int, int]) -> Iterator[Tuple[int
         yield x, y
     
     
-def generate_dungeon(max_rooms: int, min_room_size: int, max_room_size: int, 
-                     map_width: int, map_height: int, generator: Generator) -> DungeonMap:
-    
-    player = generator.player
-    dungeon = DungeonMap(generator, map_width, map_height, [player])
-    rooms: List[RectRoom] = []
-    center_of_last_room = (0, 0)
-    
+def scattered_rooms(max_rooms: int, min_room_size: int, max_room_size: int,
+                    map_width: int, map_height: int, rng: random.Random) -> Iterator[RectRoom]:
+    """Yield rooms placed at random, skipping any attempt which would overlap an earlier room."""
+    # Every tile covered by a room, walls included, so overlap tests don't have to check each earlier room.
+    occupied = np.zeros((map_width, map_height), dtype = bool, order = "F")
+
     for r in range(max_rooms):
-        room_width = random.randint(min_room_size, max_room_size)
-        room_height = random.randint(min_room_size, max_room_size)
+        room_width = rng.randint(min_room_size, max_room_size)
+        room_height = rng.randint(min_room_size, max_room_size)
 
-        x = random.randint(0, dungeon.width - room_width - 1)
-        y = random.randint(0, dungeon.height - room_height - 1)
+        x = rng.randint(0, map_width - room_width - 1)
+        y = rng.randint(0, map_height - room_height - 1)
 
         # RectRoom class makes rectangles easier to work with
         new_room = RectRoom(x, y, room_width, room_height)
+        outer = slice(new_room.x1, new_room.x2 + 1), slice(new_room.y1, new_room.y2 + 1)
 
-        # Run through the other rooms and see if they intersect with this one.
-        if any(new_room.intersects(other_room) for other_room in rooms):
+        # Check if any tile of this room is already taken by other rooms.
+        if occupied[outer].any():
             continue  # This room intersects, so go to the next attempt.
         # If there are no intersections then the room is valid.
+        occupied[outer] = True
+        yield new_room
+
+def bsp_rooms(max_rooms: int, min_room_size: int, max_room_size: int,
+              map_width: int, map_height: int, rng: random.Random) -> Iterator[RectRoom]:
+    """Yield one room in each leaf of a binary space partition of the map, so no attempts are wasted.
+
+    The map is split recursively with the room budget shared out by area, and rooms are yielded in tree order so
+    that rooms which follow each other are also close to each other.
+    """
+    min_leaf_size = min_room_size + 1  # A room and its far wall.
+
+    def split(x: int, y: int, width: int, height: int, room_budget: int) -> Iterator[RectRoom]:
+        can_split_x = width >= min_leaf_size * 2
+        can_split_y = height >= min_leaf_size * 2
+        if room_budget > 1 and (can_split_x or can_split_y):
+            if can_split_x and (width >= height or not can_split_y):
+                cut = rng.randint(min_leaf_size, width - min_leaf_size)
+                first, second = (x, y, cut, height), (x + cut, y, width - cut, height)
+            else:
+                cut = rng.randint(min_leaf_size, height - min_leaf_size)
+                first, second = (x, y, width, cut), (x, y + cut, width, height - cut)
+            first_budget = round(room_budget * (first[2] * first[3]) / (width * height))
+            first_budget = max(1, min(first_budget, room_budget - 1))
+            yield from split(*first, first_budget)
+            yield from split(*second, room_budget - first_budget)
+            return
+
+        room_width = rng.randint(min_room_size, min(max_room_size, width - 1))
+        room_height = rng.randint(min_room_size, min(max_room_size, height - 1))
+        yield RectRoom(
+            rng.randint(x, x + width - 1 - room_width),
+            rng.randint(y, y + height - 1 - room_height),
+            room_width,
+            room_height,
+        )
+
+    if max_rooms > 0 and map_width >= min_leaf_size and map_height >= min_leaf_size:
+        yield from split(0, 0, map_width, map_height, max_rooms)
+
+# The ways generate_dungeon can lay out rooms.
+ROOM_LAYOUTS = {
+    "scatter": scattered_rooms,
+    "bsp": bsp_rooms,
+}
 
+def generate_dungeon(max_rooms: int, min_room_size: int, max_room_size: int, 
+                     map_width: int, map_height: int, generator: Generator, layout: str = "scatter", *,
+                     floor: int, layout_rng: random.Random, spawn_rng: random.Random) -> DungeonMap:
+    """Generate a new floor, rooms and tunnels are drawn from `layout_rng` and whatever lives in them from `spawn_rng`.
+
+    Keeping the streams apart means changing the spawn tables never changes the layout of a seeded floor.
+    The player isn't touched, they are placed at `player_start` once the floor is entered, so floors can be
+    generated away from the main thread.
+    """
+    dungeon = DungeonMap(generator, map_width, map_height)
+    rooms: List[RectRoom] = []
+    center_of_last_room = (0, 0)
+    
+    for new_room in ROOM_LAYOUTS[layout](max_rooms, min_room_size, max_room_size, map_width, map_height, layout_rng):
         # Dig out this rooms inner area.
         dungeon.tiles[new_room.inner] = tile_types.floor
 
         if len(rooms) == 0: # player room
-            player.place(*new_room.center, dungeon)
+            dungeon.player_start = new_room.center
         else:  
-            for x, y in L_tunnel(rooms[-1].center, new_room.center):
+            for x, y in L_tunnel(rooms[-1].center, new_room.center, layout_rng):
                 dungeon.tiles[x, y] = tile_types.floor
                 
             center_of_last_room = new_room.center
         
-        spawn_entities(new_room, dungeon, generator.game_world.current_floor)
         dungeon.tiles[center_of_last_room] = tile_types.stairs
         dungeon.stairs_location = center_of_last_room
         rooms.append(new_room)
 
+    spawn_entities(rooms, dungeon, floor, np.random.default_rng(spawn_rng.getrandbits(128)))
+    dungeon.mark_tiles_changed()
     return dungeon
\ No newline at end of file
@@ -10,8 +10,10 @@ def get_names_at_location(x: int, y: int, dungeon_map: DungeonMap) -> str:
     if not dungeon_map.bounds_check(x, y) or not dungeon_map.visible[x, y]:
         return ""
 
-    names = ", ".join(entity.name for entity in dungeon_map.entities if entity.x == x and entity.y == y)
-    return names.capitalize()
+    names = [entity.name for entity in dungeon_map.get_entities_at_location(x, y)]
+    if (x, y) in dungeon_map.corpse_names:
+        names.insert(0, dungeon_map.corpse_names[x, y])
+    return ", ".join(names).capitalize()
 
 def render_bar(console: Console, current_value: int, maximum_value: int, total_width: int) -> None:
     bar_width = int(float(current_value) / maximum_value * total_width)
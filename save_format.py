@@ -0,0 +1,404 @@
+"""The save file format.
+
+A save starts with a magic string, the format version and the codec of the rest of the file. The rest is an
+uncompressed npz holding every map array as a raw buffer, along with JSON records of the entities and the
+game state. Derived state such as visibility, pathfinding costs and render caches is never saved.
+"""
+from __future__ import annotations
+from collections import deque
+from enum import Enum
+import io
+import json
+import lzma
+import os
+import struct
+import tempfile
+import zlib
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple, TYPE_CHECKING
+import numpy as np
+from entity_list import Actor, Item
+from components import consumable, equippable, fighter, level
+from components.ai import BaseAI, ConfusedEnemy, HostileEnemy
+from components.base_component import BaseComponent
+from components.equipment import Equipment
+from components.inventory import Inventory
+from entities import Entity
+from equipment_types import EquipmentType
+from message_log import Message
+from render_order import RenderOrder
+from scheduler import NORMAL_SPEED
+if TYPE_CHECKING:
+    from generator import Generator
+    from map import DungeonMap
+
+MAGIC = b"RUZESAVE"
+SAVE_VERSION = 1
+HEADER = struct.Struct("<HB")  # Version, codec id.
+
+# Codec name to its id in the header, and its compress and decompress functions.
+CODECS: Dict[str, Tuple[int, Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    "none": (0, lambda data: data, lambda data: data),
+    "fast": (1, lambda data: zlib.compress(data, 1), zlib.decompress),
+    "max": (2, lambda data: lzma.compress(data, preset = 9 | lzma.PRESET_EXTREME), lzma.decompress),
+}
+DEFAULT_CODEC = "fast"
+
+AI_TYPES = {cls.__name__: cls for cls in (HostileEnemy, ConfusedEnemy)}
+COMPONENT_TYPES = {
+    name: cls
+    for module in (consumable, equippable, fighter, level)
+    for name, cls in vars(module).items()
+    if isinstance(cls, type) and issubclass(cls, BaseComponent)
+}
+ENUM_FIELDS = {"equipment_type": EquipmentType}
+EQUIPMENT_SLOTS = ("weapon", "armor", "ring")
+
+
+def component_record(component: Optional[BaseComponent]) -> Optional[Dict[str, Any]]:
+    if component is None:
+        return None
+    record: Dict[str, Any] = {"type": type(component).__name__}
+    for key, value in vars(component).items():
+        if key != "parent":
+            record[key] = value.name if isinstance(value, Enum) else value
+    return record
+
+
+def component_from_record(record: Optional[Dict[str, Any]]) -> Any:
+    if record is None:
+        return None
+    fields = dict(record)
+    cls = COMPONENT_TYPES[fields.pop("type")]
+    component = cls.__new__(cls)
+    for key, enum_type in ENUM_FIELDS.items():
+        if key in fields:
+            fields[key] = enum_type[fields[key]]
+    component.__dict__.update(fields)
+    return component
+
+
+def ai_record(ai: Optional[BaseAI]) -> Optional[Dict[str, Any]]:
+    if ai is None:
+        return None
+    if isinstance(ai, ConfusedEnemy):
+        return {"type": "ConfusedEnemy", "turns_remaining": ai.turns_remaining, "previous_ai": ai_record(ai.previous_ai)}
+    return {"type": type(ai).__name__, "last_seen_target": getattr(ai, "last_seen_target", None)}
+
+
+def ai_from_record(record: Optional[Dict[str, Any]], actor: Actor) -> Optional[BaseAI]:
+    if record is None:
+        return None
+    if record["type"] == "ConfusedEnemy":
+        return ConfusedEnemy(actor, ai_from_record(record["previous_ai"], actor), record["turns_remaining"])
+    ai = AI_TYPES[record["type"]](actor)
+    if record.get("last_seen_target") is not None:
+        ai.last_seen_target = tuple(record["last_seen_target"])
+    return ai
+
+
+def entity_record(entity: Entity) -> Dict[str, Any]:
+    """Return a JSON compatible record of an entity, without any reference to its parent."""
+    record: Dict[str, Any] = {
+        "x": entity.x,
+        "y": entity.y,
+        "char": entity.char,
+        "color": entity.color,
+        "name": entity.name,
+        "blocks_movement": entity.blocks_movement,
+        "render_order": entity.render_order.name,
+    }
+    if isinstance(entity, Actor):
+        items = entity.inventory.items
+        record.update(
+            type = "actor",
+            ai_cls = entity.ai_cls.__name__,
+            ai = ai_record(entity.ai),
+            fighter = component_record(entity.fighter),
+            level = component_record(entity.level),
+            speed = entity.speed,
+            capacity = entity.inventory.capacity,
+            items = [entity_record(item) for item in items],
+            # Equipped items are saved as indexes into the inventory.
+            equipment = {
+                slot: items.index(getattr(entity.equipment, slot))
+                for slot in EQUIPMENT_SLOTS
+                if getattr(entity.equipment, slot) in items
+            },
+        )
+    elif isinstance(entity, Item):
+        record.update(
+            type = "item",
+            consumable = component_record(entity.consumable),
+            equippable = component_record(entity.equippable),
+        )
+    return record
+
+
+def entity_from_record(record: Dict[str, Any], equippables: Optional[Dict[str, Any]] = None) -> Entity:
+    """Build a parentless entity from `entity_record` output.
+
+    Equal equippables are only built once per `equippables` cache, so loaded items share them like spawned ones do.
+    """
+    if equippables is None:
+        equippables = {}
+    common = dict(x = record["x"], y = record["y"], char = record["char"], color = tuple(record["color"]), name = record["name"])
+    entity: Entity
+    if record["type"] == "actor":
+        inventory = Inventory(capacity = record["capacity"])
+        for item_record in record["items"]:
+            item = entity_from_record(item_record, equippables)
+            item.parent = inventory
+            inventory.items.append(item)
+        actor = Actor(
+            **common,
+            ai_cls = AI_TYPES[record["ai_cls"]],
+            fighter = component_from_record(record["fighter"]),
+            inventory = inventory,
+            equipment = Equipment(**{slot: inventory.items[index] for slot, index in record["equipment"].items()}),
+            level = component_from_record(record["level"]),
+            speed = record.get("speed", NORMAL_SPEED),
+        )
+        actor.ai = ai_from_record(record["ai"], actor)
+        entity = actor
+    else:
+        key = json.dumps(record["equippable"], sort_keys = True)
+        if key not in equippables:
+            equippables[key] = component_from_record(record["equippable"])
+        entity = Item(**common, consumable = component_from_record(record["consumable"]), equippable = equippables[key])
+    entity.blocks_movement = record["blocks_movement"]
+    entity.render_order = RenderOrder[record["render_order"]]
+    return entity
+
+
+def json_array(data: Any) -> np.ndarray:
+    return np.frombuffer(json.dumps(data, separators = (",", ":")).encode("utf-8"), dtype = np.uint8)
+
+
+def array_json(array: np.ndarray) -> Any:
+    return json.loads(array.tobytes().decode("utf-8"))
+
+
+def tile_palette(tiles: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the distinct tiles of a flat tile array and the index of every tile into them.
+
+    Maps only hold a handful of distinct tiles, so matching one at a time is much faster than np.unique,
+    which has to sort the structured tiles.
+    """
+    tile_bytes = tiles.view(np.dtype((np.void, tiles.dtype.itemsize)))
+    tile_indexes = np.zeros(len(tiles), dtype = np.uint16)
+    palette = []
+    remaining = np.ones(len(tiles), dtype = bool)
+    while remaining.any():
+        first = int(remaining.argmax())
+        same = tile_bytes == tile_bytes[first]
+        tile_indexes[same] = len(palette)
+        palette.append(tiles[first])
+        remaining &= ~same
+    return np.array(palette, dtype = tiles.dtype), tile_indexes.astype(np.uint8 if len(palette) <= 256 else np.uint16)
+
+
+def floor_arrays(dungeon_map: DungeonMap, exclude: Optional[Entity] = None) -> Dict[str, np.ndarray]:
+    """Return the arrays which describe a floor: its tiles as indexes into a palette, what was explored and its entities."""
+    palette, tile_indexes = tile_palette(dungeon_map.tiles.ravel(order = "F"))
+    return {
+        "size": np.array([dungeon_map.width, dungeon_map.height]),
+        "palette": palette,
+        "tile_indexes": tile_indexes,
+        "encountered": np.packbits(dungeon_map.encountered.ravel(order = "F")),
+        "stairs_location": np.array(dungeon_map.stairs_location),
+        "player_start": np.array(dungeon_map.player_start),
+        "entities": json_array([entity_record(entity) for entity in dungeon_map.entities if entity is not exclude]),
+        "corpse_layer": dungeon_map.corpse_layer.copy(),  # Corpses keep decaying while an autosave is encoded.
+        "corpse_names": json_array([[x, y, name] for (x, y), name in dungeon_map.corpse_names.items()]),
+    }
+
+
+def floor_from_arrays(arrays: Mapping[str, np.ndarray], generator: Generator) -> DungeonMap:
+    """Rebuild a floor from `floor_arrays` output."""
+    from map import DungeonMap
+
+    width, height = (int(i) for i in arrays["size"])
+    dungeon_map = DungeonMap(generator, width, height)
+    dungeon_map.tiles[...] = arrays["palette"][arrays["tile_indexes"]].reshape((width, height), order = "F")
+    dungeon_map.encountered[...] = (
+        np.unpackbits(arrays["encountered"], count = width * height).astype(bool).reshape((width, height), order = "F")
+    )
+    dungeon_map.stairs_location = tuple(int(i) for i in arrays["stairs_location"])
+    dungeon_map.player_start = tuple(int(i) for i in arrays["player_start"])
+    if "corpse_layer" in arrays:  # Saves from before the corpse layer keep their corpses as entities.
+        dungeon_map.corpse_layer[...] = arrays["corpse_layer"]
+        # Only tiles which still show a corpse, so a name can't outlive its glyph.
+        dungeon_map.corpse_names = {
+            (x, y): name for x, y, name in array_json(arrays["corpse_names"]) if dungeon_map.corpse_layer["ch"][x, y]
+        }
+    equippables: Dict[str, Any] = {}
+    for record in array_json(arrays["entities"]):
+        entity = entity_from_record(record, equippables)
+        entity.parent = dungeon_map
+        dungeon_map.add_entity(entity)
+    dungeon_map.mark_tiles_changed()
+    return dungeon_map
+
+
+def message_records(messages: List[Message]) -> List[Any]:
+    return [[message.plain_text, message.fg, message.count] for message in messages]
+
+
+def messages_from_records(records: List[Any]) -> List[Message]:
+    messages = []
+    for text, fg, count in records:
+        message = Message(text, tuple(fg))
+        message.count = count
+        messages.append(message)
+    return messages
+
+
+class Snapshot:
+    """A copy of everything a save holds, taken on the main thread so it can be encoded on any thread.
+
+    Nothing in a snapshot refers back to the live game.
+    """
+
+    def __init__(self, generator: Generator):
+        game_world = generator.game_world
+        message_log = generator.message_log
+        self.arrays = {
+            f"current.{key}": array for key, array in floor_arrays(generator.dungeon_map, exclude = generator.player).items()
+        }
+        # Archived floors are read as they are, floors still in memory are only compressed once encoded.
+        self.archived_floors: Dict[int, bytes] = {}
+        for floor, filename in game_world.floors.archived.items():
+            with open(filename, "rb") as f:
+                self.archived_floors[floor] = f.read()
+        self.hot_floors = {floor: floor_arrays(dungeon_map) for floor, dungeon_map in game_world.floors.hot.items()}
+
+        self.arrays["state"] = json_array({
+            "player": entity_record(generator.player),
+            "game_world": {
+                "map_width": game_world.map_width,
+                "map_height": game_world.map_height,
+                "max_rooms": game_world.max_rooms,
+                "min_room_size": game_world.min_room_size,
+                "max_room_size": game_world.max_room_size,
+                "current_floor": game_world.current_floor,
+                "layout": game_world.layout,
+                "seed": game_world.seed,
+                "prefetch": game_world.prefetch,
+                "ai_rng": game_world.ai_rng.getstate(),
+                "hot_floors": game_world.floors.hot_floors,
+                # Least recently used first.
+                "stored_floors": list(self.archived_floors) + list(self.hot_floors),
+            },
+            "message_log": {
+                "capacity": message_log.messages.maxlen,
+                "spill_filename": message_log.spill_filename,
+                "spill_page_offsets": message_log.spill_page_offsets,
+                "spill_buffer": message_records(message_log.spill_buffer),
+                "messages": message_records(list(message_log.messages)),
+            },
+        })
+
+    def encode(self, codec: str = DEFAULT_CODEC) -> bytes:
+        """Return this snapshot as save file data."""
+        arrays = dict(self.arrays)
+        # Stored floors are saved in their floor store archive form, which is already compressed.
+        for floor, data in self.archived_floors.items():
+            arrays[f"floor_{floor}"] = np.frombuffer(data, dtype = np.uint8)
+        for floor, hot_floor_arrays in self.hot_floors.items():
+            arrays[f"floor_{floor}"] = np.frombuffer(pack_arrays(hot_floor_arrays), dtype = np.uint8)
+        body = io.BytesIO()
+        np.savez(body, **arrays)
+        codec_id, compress, _ = CODECS[codec]
+        return MAGIC + HEADER.pack(SAVE_VERSION, codec_id) + compress(body.getvalue())
+
+
+def pack_arrays(arrays: Dict[str, np.ndarray]) -> bytes:
+    """Return arrays as a compressed npz."""
+    archive = io.BytesIO()
+    np.savez_compressed(archive, **arrays)
+    return archive.getvalue()
+
+
+def dumps(generator: Generator, codec: str = DEFAULT_CODEC) -> bytes:
+    """Return a game as save file data."""
+    return Snapshot(generator).encode(codec)
+
+
+def loads(data: bytes) -> Generator:
+    """Return the game saved in `data`."""
+    from generator import Generator
+    from map import GameWorld
+
+    if not data.startswith(MAGIC):
+        # Pickled saves from before this format depend on class layouts which no longer exist.
+        raise ValueError("This save is from an unsupported older version of the game.")
+    version, codec_id = HEADER.unpack_from(data, len(MAGIC))
+    if version > SAVE_VERSION:
+        raise ValueError(f"This save is from a newer version of the game (format {version}).")
+    decompress = next((codec[2] for codec in CODECS.values() if codec[0] == codec_id), None)
+    if decompress is None:
+        raise ValueError(f"Unknown save codec {codec_id}")
+
+    with np.load(io.BytesIO(decompress(data[len(MAGIC) + HEADER.size:]))) as archive:
+        arrays = {key: archive[key] for key in archive.files}
+    state = array_json(arrays.pop("state"))
+
+    player = entity_from_record(state["player"])
+    assert isinstance(player, Actor)
+    generator = Generator(player)
+    world_state = state["game_world"]
+    game_world = GameWorld(
+        generator = generator,
+        map_width = world_state["map_width"],
+        map_height = world_state["map_height"],
+        max_rooms = world_state["max_rooms"],
+        min_room_size = world_state["min_room_size"],
+        max_room_size = world_state["max_room_size"],
+        current_floor = world_state["current_floor"],
+        layout = world_state["layout"],
+        seed = world_state["seed"],
+        prefetch = world_state["prefetch"],
+    )
+    version_number, internal_state, gauss_next = world_state["ai_rng"]
+    game_world.ai_rng.setstate((version_number, tuple(internal_state), gauss_next))
+    game_world.floors.hot_floors = world_state["hot_floors"]
+    generator.game_world = game_world
+
+    for floor in world_state["stored_floors"]:
+        game_world.floors.write_archive(floor, arrays[f"floor_{floor}"].tobytes())
+    generator.dungeon_map = floor_from_arrays(
+        {key[len("current."):]: array for key, array in arrays.items() if key.startswith("current.")}, generator
+    )
+    player.place(player.x, player.y, generator.dungeon_map)
+
+    log_state = state["message_log"]
+    message_log = generator.message_log
+    message_log.messages = deque(messages_from_records(log_state["messages"]), maxlen = log_state["capacity"])
+    message_log.spill_filename = log_state["spill_filename"]
+    message_log.spill_page_offsets = log_state["spill_page_offsets"]
+    message_log.spill_buffer = messages_from_records(log_state["spill_buffer"])
+    generator.update()
+    return generator
+
+
+def write_save(data: bytes, filename: str) -> None:
+    """Write save data through a temporary file, so `filename` always holds a whole save even if the game dies midway."""
+    fd, temp_filename = tempfile.mkstemp(dir = os.path.dirname(os.path.abspath(filename)), suffix = ".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_filename, filename)
+    except BaseException:
+        os.remove(temp_filename)
+        raise
+
+
+def save_game(generator: Generator, filename: str, codec: str = DEFAULT_CODEC) -> None:
+    write_save(dumps(generator, codec), filename)
+
+
+def load_game(filename: str) -> Generator:
+    with open(filename, "rb") as f:
+        return loads(f.read())
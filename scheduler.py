@@ -0,0 +1,106 @@
+"""Decide which actors act when, by how fast they are."""
+from __future__ import annotations
+import heapq
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+import numpy as np
+import exceptions
+if TYPE_CHECKING:
+    from entities import Actor
+    from generator import Generator
+    from map import DungeonMap
+
+NORMAL_SPEED = 100
+ACTION_COST = 100  # Time an action takes at normal speed, faster actors take proportionally less.
+
+
+def action_delay(actor: Actor) -> int:
+    return max(1, ACTION_COST * NORMAL_SPEED // actor.speed)
+
+
+class TurnScheduler:
+    """
+    A queue of monsters ordered by the time of their next action. Each player action moves time forward by the
+    players delay, then every monster whose action time has come acts, faster ones possibly more than once.
+
+    Monsters with nothing to do drop out of the queue and are woken once they are in sight of the player,
+    so a turn only costs as much as the monsters which are actually active. Ties go to whoever was queued first,
+    so turn order is the same on every replay.
+    """
+
+    def __init__(self) -> None:
+        self.dungeon_map: Optional[DungeonMap] = None
+        self.now = 0
+        # Entries are (time, sequence, actor), entries which no longer match `scheduled` are skipped when popped.
+        self.queue: List[Tuple[int, int, Actor]] = []
+        self.scheduled: Dict[Actor, int] = {}  # Actor to the sequence number of its live entry.
+        self.sequence = 0
+
+    def schedule(self, actor: Actor, time: int) -> None:
+        self.sequence += 1
+        self.scheduled[actor] = self.sequence
+        heapq.heappush(self.queue, (time, self.sequence, actor))
+
+    def reset(self, generator: Generator) -> None:
+        """Start over on the current map, for a new or loaded floor. Every monster that isn't idle is queued."""
+        self.dungeon_map = generator.dungeon_map
+        self.queue.clear()
+        self.scheduled.clear()
+        for actor in self.dungeon_map.actors:
+            if actor is not generator.player and actor.ai and not actor.ai.is_idle:
+                self.schedule(actor, self.now)
+
+    def wake_visible(self, generator: Generator) -> None:
+        """Queue the dormant monsters which stand in the players sight."""
+        dungeon_map = generator.dungeon_map
+        store = dungeon_map.entity_store
+        dormant = store.alive & store.visible(dungeon_map.visible)
+        dormant[np.array([store.rows[actor] for actor in self.scheduled if actor in store.rows], dtype = np.intp)] = False
+        player_row = store.rows.get(generator.player)
+        if player_row is not None:
+            dormant[player_row] = False
+        for actor in store.select(dormant):
+            self.schedule(actor, self.now)  # type: ignore[arg-type]
+
+    def pop_due(self) -> List[Tuple[int, Actor]]:
+        """Remove and return every monster whose action time has come with that time, in the order they act."""
+        due = []
+        while self.queue and self.queue[0][0] <= self.now:
+            time, sequence, actor = heapq.heappop(self.queue)
+            if self.scheduled.get(actor) == sequence:
+                del self.scheduled[actor]
+                due.append((time, actor))
+        return due
+
+    def run_turn(self, generator: Generator) -> None:
+        """Move time forward by one player action and let every monster which is due act."""
+        if self.dungeon_map is not generator.dungeon_map:
+            self.reset(generator)
+        self.now += action_delay(generator.player)
+        self.wake_visible(generator)
+
+        dungeon_map = generator.dungeon_map
+        store = dungeon_map.entity_store
+        player = generator.player
+        # Faster monsters can be due again after acting, so actions are taken in rounds.
+        due = self.pop_due()
+        while due:
+            due = [(time, actor) for time, actor in due if actor in dungeon_map.living_actors]
+            # Decide what every due monster can see and how far it is from the player in one pass. Monsters only
+            # move themselves, so neither changes while this round is applied.
+            rows = np.array([store.rows[actor] for _, actor in due], dtype = np.intp)
+            xs, ys = store.x[rows], store.y[rows]
+            visible = dungeon_map.visible[xs, ys]
+            distance = np.maximum(np.abs(xs - player.x), np.abs(ys - player.y))  # Chebyshev distance.
+            for (time, actor), actor_visible, actor_distance in zip(due, visible.tolist(), distance.tolist()):
+                if not actor.ai:
+                    continue  # It was killed earlier in this round.
+                try:
+                    actor.ai.take_turn(actor_visible, actor_distance)
+                except exceptions.Impossible:
+                    pass  # Ignore impossible action exceptions from AI.
+                if not actor.ai or actor not in dungeon_map.living_actors:
+                    continue
+                if actor.ai.is_idle and not dungeon_map.visible[actor.x, actor.y]:
+                    continue  # Dormant until the player sees it again.
+                self.schedule(actor, time + action_delay(actor))
+            due = self.pop_due()
@@ -1,10 +1,8 @@
 """Handle the loading and initialization of game sessions."""
 from __future__ import annotations
-import copy
-import lzma
-import pickle
 import traceback
 from typing import Optional
+import numpy as np
 import tcod
 import color
 import libtcodpy
@@ -12,14 +10,27 @@ from generator import Generator
 import entity_list
 from map import GameWorld
 import input_handler
+import save_format
+from autosave import Autosaver
 
 
-# Load the background image and remove the alpha channel.
-background_image = tcod.image.load("menu_background.png")[:, :, :3]
+# The menu background is loaded on first use, so headless runs never have to.
+background_image: Optional[np.ndarray] = None
 
 
-def new_game() -> Generator:
-    """Return a brand new game session as an Engine instance."""
+def get_background_image() -> np.ndarray:
+    """Load the background image and remove the alpha channel."""
+    global background_image
+    if background_image is None:
+        background_image = tcod.image.load("menu_background.png")[:, :, :3]
+    return background_image
+
+
+def new_game(seed: Optional[int] = None) -> Generator:
+    """Return a brand new game session as an Engine instance.
+
+    The same `seed` always generates the same floors, a random one is picked if it isn't given.
+    """
     map_width = 80
     map_height = 43
 
@@ -27,7 +38,7 @@ def new_game() -> Generator:
     min_room_size = 6
     max_rooms = 30
 
-    player = copy.deepcopy(entity_list.player)
+    player = entity_list.player.instantiate()
 
     generator = Generator(player)
 
@@ -38,18 +49,20 @@ def new_game() -> Generator:
         max_room_size = max_room_size,
         map_width = map_width,
         map_height = map_height,
+        seed = seed,
     )
     generator.game_world.generate_floor()
     generator.update()
 
     generator.message_log.add_message("Hello and welcome, adventurer, to the Labyrinth of Ruze!!!", color.welcome_text)
+    generator.autosaver = Autosaver(generator, "savegame.sav")
     return generator
 
 def load_game_file(filename: str) -> Generator:
     """Load a Generator instance from a file."""
-    with open(filename, "rb") as f:
-        generator = pickle.loads(lzma.decompress(f.read()))
-    assert isinstance(generator, Generator)
+    generator = save_format.load_game(filename)
+    generator.autosaver = Autosaver(generator, filename)
+    generator.game_world.prefetch_next_floor()
     return generator
 
 class MainMenu(input_handler.BaseEventHandler):
@@ -57,7 +70,7 @@ class MainMenu(input_handler.BaseEventHandler):
 
     def on_render(self, console: tcod.console.Console) -> None:
         """Render the main menu on a background image."""
-        console.draw_semigraphics(background_image, 0, 0)
+        console.draw_semigraphics(get_background_image(), 0, 0)
 
         console.print(
             console.width // 2,